@@ -1,10 +1,190 @@
+""" function checks the health of the Bolt-PO EC2 API containers
+
+    function accepts an optional payload with the endpoints to probe:
+
+    {
+        "endpoints": [
+            {
+                "name": "ec2-api",
+                "url": "http://18.153.175.246:8080/api/admin/check-health",
+                "expect_status": 200,          --- optional ---
+                "expect_body": "UP"            --- optional, text the body must contain ---
+            }
+        ],
+        "record": true  --- optional, false skips the latency history and the published verdict ---
+    }
+
+    run the module directly to probe a local HTTP stand-in:
+
+        python bolt_check.py
+"""
+
+import time
+import logging
 import requests
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import INFO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from history import append, get_backend
+from gate import publish_state
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+ENDPOINTS = [
+    {
+        "name": "ec2-api",
+        "url": "http://18.153.175.246:8080/api/admin/check-health",
+        "expect_status": 200,
+    },
+]
+
+# the lambda runs with a 15 s timeout: the probes get PROBE_BUDGET of it, what is left
+# publishes the verdict and the history. one probe with its retry takes up to 6.2 s
+CONNECT_TIMEOUT = 1.0  # in seconds
+READ_TIMEOUT = 2.0  # in seconds
+MAX_RETRIES = 1
+PROBE_BUDGET = 8.0  # in seconds, for all the probes together
+POOL_SIZE = 10
+
+
+def get_session():
+    """ pooled session with bounded retries on connection errors and 5xx answers """
+    retries = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,
+        status=MAX_RETRIES,
+        status_forcelist=[502, 503, 504],
+        backoff_factor=0.2,
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# reused by warm invocations
+session = get_session()
+
+
+def new_result(endpoint, error=None):
+    return {
+        "name": endpoint.get("name", endpoint["url"]),
+        "url": endpoint["url"],
+        "status_code": None,
+        "latency_ms": None,
+        "healthy": False,
+        "checks": {},
+        "error": error,
+    }
+
+
+def probe(endpoint, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+    """ probes one endpoint and returns its status code, latency and body checks """
+    result = new_result(endpoint)
+
+    start = time.perf_counter()
+    try:
+        response = session.get(endpoint["url"], timeout=timeout)
+    except requests.RequestException as err:
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["error"] = f"{type(err).__name__}: {str(err)}"
+        return result
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["status_code"] = response.status_code
+
+    checks = {"status": response.status_code == endpoint.get("expect_status", 200)}
+    if endpoint.get("expect_body") is not None:
+        checks["body"] = endpoint["expect_body"] in response.text
+    result["checks"] = checks
+    result["healthy"] = all(checks.values())
+
+    return result
+
+
+def probe_all(endpoints, budget=PROBE_BUDGET):
+    """ probes the endpoints concurrently, the ones without an answer after budget seconds failed """
+    if len(endpoints) == 0:
+        return []
+    pool = ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(endpoints)))
+    futures = [pool.submit(probe, endpoint) for endpoint in endpoints]
+    wait(futures, timeout=budget)
+    # a hanging probe is left behind, the verdict must still be published in time
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for endpoint, future in zip(endpoints, futures):
+        if future.done() and not future.cancelled():
+            results.append(future.result())
+        else:
+            results.append(new_result(endpoint, error=f"no answer within the {budget} s probe budget"))
+    return results
+
 
 def handler(event, context):
-    url = "http://18.153.175.246:8080/api/admin/check-health"
-    _ = requests.get(url)
+    event = event or {}
+    endpoints = event.get("endpoints", ENDPOINTS)
+
+    results = probe_all(endpoints)
+    for result in results:
+        logger.info(
+            f"{result['name']}: status {result['status_code']}, "
+            f"{result['latency_ms']} ms, healthy {result['healthy']}"
+        )
+
+    if event.get("record", True):
+        try:
+            publish_state(results)
+        except Exception as err:
+            logger.error(f"Health verdict not published: {str(err)}")
+        try:
+            append(get_backend(), results)
+        except Exception as err:
+            # losing one measurement must not hide the health verdict
+            logger.error(f"Health history not saved: {str(err)}")
 
     return {
         "function_name": "Bolt-PO-CheckHealth",
+        "healthy": all(result["healthy"] for result in results),
+        "endpoints": results,
     }
+
+
+if __name__ == "__main__":
+    # local stand-in: one healthy, one failing and one hanging endpoint
+    import json
+    import threading
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/slow":
+                time.sleep(READ_TIMEOUT + 1)
+            status = 500 if self.path == "/down" else 200
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(b'{"status": "UP"}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    print(json.dumps(handler({
+        "record": False,
+        "endpoints": [
+            {"name": "up", "url": f"{base}/health", "expect_body": "UP"},
+            {"name": "down", "url": f"{base}/down"},
+            {"name": "slow", "url": f"{base}/slow"},
+        ]
+    }, None), indent=4))
+    server.shutdown()
@@ -0,0 +1,117 @@
+""" cached health verdict of the EC2 API and the gate the pipeline asks before each stage
+
+    every CheckHealth run publishes the verdict to health-checks/state.json:
+
+    {
+        "healthy": true,
+        "checked_at": "2024-05-17T06:00:01+00:00",
+        "unhealthy_since": null,
+        "endpoints": {"ec2-api": true}
+    }
+
+    gate handler accepts an optional payload:
+
+    {
+        "max_age": 900,     --- seconds after which the verdict is too old to be trusted ---
+        "skip_after": 600   --- seconds of continuous outage after which the stage is skipped ---
+    }
+
+    and answers with a decision: "proceed", "retry" (come back later) or "skip"
+"""
+
+import json
+import time
+import logging
+
+from datetime import datetime, timezone
+from logging import INFO
+from history import get_backend
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+STATE_PREFIX = "health-checks/"
+STATE_FILE = "state.json"
+
+MAX_AGE = 900  # in seconds
+SKIP_AFTER = 600  # in seconds
+RETRY_AFTER = 60  # in seconds, suggested to the caller
+STATE_CACHE_TTL = 5  # in seconds, warm gate invocations reuse the verdict
+
+_cached_state = None
+
+
+def read_state(backend=None):
+    """ returns the published verdict or None if there is none yet """
+    backend = backend or get_backend(STATE_PREFIX)
+    data = backend.read(STATE_FILE)
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def publish_state(results, checked_at=None, backend=None):
+    """ writes the verdict of a CheckHealth run, keeping track of when an outage began """
+    backend = backend or get_backend(STATE_PREFIX)
+    if checked_at is None:
+        checked_at = datetime.now(timezone.utc)
+
+    healthy = all(result["healthy"] for result in results)
+    unhealthy_since = None
+    if not healthy:
+        previous = read_state(backend)
+        if previous is not None and previous.get("unhealthy_since"):
+            unhealthy_since = previous["unhealthy_since"]
+        else:
+            unhealthy_since = checked_at.isoformat()
+
+    state = {
+        "healthy": healthy,
+        "checked_at": checked_at.isoformat(),
+        "unhealthy_since": unhealthy_since,
+        "endpoints": {result["name"]: result["healthy"] for result in results},
+    }
+    backend.write(STATE_FILE, json.dumps(state).encode("utf-8"), "application/json")
+    return state
+
+
+def decide(state, now, max_age=MAX_AGE, skip_after=SKIP_AFTER):
+    """ turns the verdict into a proceed / retry / skip decision """
+    if state is None:
+        return "retry", "no health verdict published yet"
+
+    age = (now - datetime.fromisoformat(state["checked_at"])).total_seconds()
+    if age > max_age:
+        return "retry", f"health verdict is {int(age)} s old"
+    if state["healthy"]:
+        return "proceed", "EC2 API healthy"
+
+    down_for = (now - datetime.fromisoformat(state["unhealthy_since"])).total_seconds()
+    if down_for > skip_after:
+        return "skip", f"EC2 API down for {int(down_for)} s"
+    return "retry", f"EC2 API down for {int(down_for)} s"
+
+
+def handler(event, context):
+    global _cached_state
+    event = event or {}
+
+    if _cached_state is None or _cached_state[0] < time.monotonic():
+        _cached_state = (time.monotonic() + STATE_CACHE_TTL, read_state())
+    state = _cached_state[1]
+
+    decision, reason = decide(
+        state,
+        datetime.now(timezone.utc),
+        max_age=event.get("max_age", MAX_AGE),
+        skip_after=event.get("skip_after", SKIP_AFTER),
+    )
+    logger.info(f"Gate decision: {decision} ({reason})")
+
+    return {
+        "function_name": "Bolt-PO-HealthGate",
+        "decision": decision,
+        "reason": reason,
+        "checked_at": state["checked_at"] if state else None,
+        "retry_after": RETRY_AFTER if decision == "retry" else None,
+    }
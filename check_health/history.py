@@ -0,0 +1,182 @@
+""" latency history of the health checks and its percentile rollups
+
+    every probe is appended to one file per day, stored column-wise as gzipped json:
+
+    health-checks/history/2024-05-17.json.gz
+    {
+        "ts": [1715932800.1, ...],
+        "endpoint": ["ec2-api", ...],
+        "status_code": [200, ...],
+        "latency_ms": [35.2, ...],
+        "healthy": [1, ...]
+    }
+
+    the files go to S3, or to a local folder when HEALTH_HISTORY_DIR is set
+
+    rollup handler accepts an optional payload:
+
+    {
+        "days": 7,
+        "granularity": "hour"  --- or "day" ---
+    }
+"""
+
+import gzip
+import json
+import math
+import os
+import logging
+import boto3
+
+from datetime import datetime, timedelta, timezone
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+BUCKET = "bolt-projects"
+HISTORY_PREFIX = "health-checks/history/"
+COLUMNS = ["ts", "endpoint", "status_code", "latency_ms", "healthy"]
+PERIOD_FORMATS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d"}
+
+
+# reused by warm invocations, building a client takes longer than the calls it makes
+s3 = boto3.client("s3")
+
+
+class S3Backend:
+    def __init__(self, bucket=BUCKET, prefix=HISTORY_PREFIX):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = s3
+
+    def read(self, name):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return obj["Body"].read()
+
+    def write(self, name, data, content_type):
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + name,
+            Body=data,
+            ContentType=content_type,
+        )
+
+
+class LocalBackend:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def read(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            return file.read()
+
+    def write(self, name, data, content_type):
+        with open(os.path.join(self.directory, name), "wb") as file:
+            file.write(data)
+
+
+def get_backend(prefix=HISTORY_PREFIX):
+    directory = os.environ.get("HEALTH_HISTORY_DIR")
+    if directory:
+        return LocalBackend(directory)
+    return S3Backend(prefix=prefix)
+
+
+def _day_file(day):
+    return f"{day.strftime('%Y-%m-%d')}.json.gz"
+
+
+def read_day(backend, day):
+    data = backend.read(_day_file(day))
+    if data is None:
+        return {column: [] for column in COLUMNS}
+    return json.loads(gzip.decompress(data))
+
+
+def append(backend, results, checked_at=None):
+    """ appends the probe results to the file of their day """
+    if checked_at is None:
+        checked_at = datetime.now(timezone.utc)
+
+    table = read_day(backend, checked_at)
+    for result in results:
+        table["ts"].append(round(checked_at.timestamp(), 3))
+        table["endpoint"].append(result["name"])
+        table["status_code"].append(result["status_code"])
+        table["latency_ms"].append(result["latency_ms"])
+        table["healthy"].append(1 if result["healthy"] else 0)
+
+    backend.write(_day_file(checked_at), gzip.compress(json.dumps(table).encode("utf-8")), "application/gzip")
+
+
+def percentile(values, pct):
+    """ nearest-rank percentile of a sorted list """
+    if len(values) == 0:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def rollup(backend, start, end, granularity="hour"):
+    """ p50/p95/p99 latency and availability per endpoint and period
+
+        start and end are utc datetimes, both days included. latencies are
+        taken from the healthy probes only, failed ones count against availability
+    """
+    period_format = PERIOD_FORMATS[granularity]
+    groups = {}
+
+    day = start
+    while day.date() <= end.date():
+        table = read_day(backend, day)
+        for i in range(len(table["ts"])):
+            period = datetime.fromtimestamp(table["ts"][i], timezone.utc).strftime(period_format)
+            group = groups.setdefault((table["endpoint"][i], period), {"latency": [], "healthy": 0, "count": 0})
+            group["count"] += 1
+            group["healthy"] += table["healthy"][i]
+            if table["latency_ms"][i] is not None and table["healthy"][i]:
+                group["latency"].append(table["latency_ms"][i])
+        day += timedelta(days=1)
+
+    rows = []
+    for (endpoint, period), group in sorted(groups.items()):
+        latencies = sorted(group["latency"])
+        rows.append({
+            "endpoint": endpoint,
+            "period": period,
+            "count": group["count"],
+            "availability": round(group["healthy"] / group["count"], 4),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        })
+    return rows
+
+
+def rollup_handler(event, context):
+    days = int(event.get("days", 7))
+    granularity = event.get("granularity", "hour")
+    if granularity not in PERIOD_FORMATS:
+        return {
+            "function_name": "Bolt-PO-HealthRollup",
+            "error_message": f"Unknown granularity: {granularity}",
+            "error_details": None,
+        }
+
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days - 1)
+
+    return {
+        "function_name": "Bolt-PO-HealthRollup",
+        "error_message": None,
+        "error_details": None,
+        "rollup": rollup(get_backend(), start, end, granularity),
+    }
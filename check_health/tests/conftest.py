@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the lambda modules import each other from the check_health folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# history builds its s3 client on import
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
@@ -0,0 +1,59 @@
+""" gate decisions from the published verdict, run with: pytest check_health/tests """
+
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+from moto import mock_aws
+from gate import MAX_AGE, SKIP_AFTER, decide, publish_state, read_state
+from history import S3Backend
+
+NOW = datetime(2024, 5, 17, 6, 0, tzinfo=timezone.utc)
+
+
+def state(age, healthy=True, down_for=None):
+    return {
+        "healthy": healthy,
+        "checked_at": (NOW - timedelta(seconds=age)).isoformat(),
+        "unhealthy_since": None if down_for is None else (NOW - timedelta(seconds=down_for)).isoformat(),
+        "endpoints": {"ec2-api": healthy},
+    }
+
+
+def test_no_verdict_retries():
+    assert decide(None, NOW)[0] == "retry"
+
+
+def test_healthy_verdict_proceeds():
+    assert decide(state(10), NOW)[0] == "proceed"
+
+
+def test_verdict_is_trusted_up_to_max_age():
+    assert decide(state(MAX_AGE), NOW)[0] == "proceed"
+    assert decide(state(MAX_AGE + 1), NOW)[0] == "retry"
+    assert decide(state(120), NOW, max_age=60)[0] == "retry"
+
+
+def test_outage_retries_then_skips():
+    assert decide(state(10, healthy=False, down_for=SKIP_AFTER), NOW)[0] == "retry"
+    assert decide(state(10, healthy=False, down_for=SKIP_AFTER + 1), NOW)[0] == "skip"
+
+
+def test_old_verdict_of_an_outage_retries():
+    assert decide(state(MAX_AGE + 1, healthy=False, down_for=SKIP_AFTER + 1), NOW)[0] == "retry"
+
+
+def test_publish_keeps_the_start_of_an_outage():
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket="bolt-projects", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+        backend = S3Backend(prefix="health-checks/")
+        backend.s3 = s3
+        down = [{"name": "ec2-api", "healthy": False}]
+
+        publish_state(down, NOW, backend)
+        publish_state(down, NOW + timedelta(minutes=5), backend)
+
+        assert read_state(backend)["unhealthy_since"] == NOW.isoformat()
+        obj = s3.head_object(Bucket="bolt-projects", Key="health-checks/state.json")
+        assert obj["ContentType"] == "application/json"
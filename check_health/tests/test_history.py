@@ -0,0 +1,80 @@
+""" latency history and its rollups, run with: pytest check_health/tests """
+
+from datetime import datetime, timezone
+
+import boto3
+
+from moto import mock_aws
+from history import LocalBackend, S3Backend, append, percentile, read_day, rollup
+
+
+def probe(name, latency_ms, healthy=True):
+    return {"name": name, "status_code": 200 if healthy else 503, "latency_ms": latency_ms, "healthy": healthy}
+
+
+def test_percentile_is_the_nearest_rank():
+    values = list(range(1, 11))
+
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 99) == 10
+    assert percentile(values, 0) == 1
+    assert percentile([42], 99) == 42
+    assert percentile([], 50) is None
+
+
+def test_append_adds_to_the_file_of_the_day(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    day = datetime(2024, 5, 17, 6, 0, tzinfo=timezone.utc)
+
+    append(backend, [probe("ec2-api", 30.0)], day)
+    append(backend, [probe("ec2-api", 40.0), probe("other", None, healthy=False)], day)
+
+    table = read_day(backend, day)
+    assert table["endpoint"] == ["ec2-api", "ec2-api", "other"]
+    assert table["latency_ms"] == [30.0, 40.0, None]
+    assert table["healthy"] == [1, 1, 0]
+
+
+def test_rollup_per_hour_and_per_day(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    for hour, latency, healthy in [(6, 10.0, True), (6, 30.0, True), (6, 900.0, False), (7, 20.0, True)]:
+        append(backend, [probe("ec2-api", latency, healthy)], datetime(2024, 5, 17, hour, tzinfo=timezone.utc))
+    append(backend, [probe("ec2-api", 50.0)], datetime(2024, 5, 18, 6, tzinfo=timezone.utc))
+
+    start = datetime(2024, 5, 17, tzinfo=timezone.utc)
+    end = datetime(2024, 5, 18, tzinfo=timezone.utc)
+    hours = rollup(backend, start, end, "hour")
+    days = rollup(backend, start, end, "day")
+
+    assert [(row["period"], row["count"], row["availability"]) for row in hours] == [
+        ("2024-05-17T06:00", 3, 0.6667),
+        ("2024-05-17T07:00", 1, 1.0),
+        ("2024-05-18T06:00", 1, 1.0),
+    ]
+    # the failed probe counts against availability, not in the latencies
+    assert (hours[0]["p50_ms"], hours[0]["p99_ms"]) == (10.0, 30.0)
+    assert [(row["period"], row["count"], row["p50_ms"], row["p95_ms"]) for row in days] == [
+        ("2024-05-17", 4, 20.0, 30.0),
+        ("2024-05-18", 1, 50.0, 50.0),
+    ]
+
+
+def test_rollup_of_days_without_history_is_empty(tmp_path):
+    day = datetime(2024, 5, 17, tzinfo=timezone.utc)
+
+    assert rollup(LocalBackend(str(tmp_path)), day, day) == []
+
+
+def test_s3_history_is_stored_as_gzip():
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket="bolt-projects", CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+        backend = S3Backend()
+        backend.s3 = s3
+        day = datetime(2024, 5, 17, 6, 0, tzinfo=timezone.utc)
+
+        append(backend, [probe("ec2-api", 30.0)], day)
+
+        obj = s3.head_object(Bucket="bolt-projects", Key="health-checks/history/2024-05-17.json.gz")
+        assert obj["ContentType"] == "application/gzip"
@@ -1,19 +1,25 @@
-import io
-import json
 import boto3
 from datetime import datetime
+from secrets_provider import get_provider
+from s3_tools import copy_objects, delete_keys
+
+INPUT_PREFIX = "purchasing-orders/input/"
+
+
+def list_input_files(s3c, bucket_name):
+    """ lists the files directly under the input folder, subfolders are left alone """
+    paginator = s3c.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=INPUT_PREFIX, Delimiter="/"):
+        for obj in page.get("Contents", []):
+            if obj["Key"] != INPUT_PREFIX:
+                yield obj["Key"]
 
 
 def handler(event, context):
-    # get AWS Secrets Manager
+    # get AWS Secrets Manager, cached across warm invocations
     secret_name = "AWS_LambdaKeys"
     region_name = "eu-north-1"
-    session = boto3.session.Session()
-    client = session.client(service_name="secretsmanager", region_name=region_name)
-    # call secrets
-    get_secrets = client.get_secret_value(SecretId=secret_name)
-    secrets = get_secrets["SecretString"]
-    secrets_json = json.loads(secrets)
+    secrets_json = get_provider(region_name).get(secret_name)
 
     AWS_ACCESS_KEY_ID = secrets_json["Access_key_ID"]
     AWS_SECRET_ACCESS_KEY = secrets_json["Secret_Access_key"]
@@ -48,41 +54,16 @@ def handler(event, context):
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
     )
 
-    # Change files names, save the files to archive folder and delete it from input
-    failed_files = []
-    for file in files:
-        try:
-            obj = s3c.get_object(Bucket=bucket_name, Key=file[0])
-            body = io.BytesIO(obj["Body"].read())
-            s3c.put_object(
-                Body=body.getvalue(),
-                Bucket=bucket_name,
-                Key=file[1],
-            )
-        except:
-            failed_files.append(file[0])
-            continue
-
-        s3c.delete_object(Bucket=bucket_name, Key=file[0])
-
-    # delete the rest of the files in the input subfolder
-    s3r = boto3.resource(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    )
-    bucket = s3r.Bucket(bucket_name)
+    # Change files names and copy the files server-side to the archive folder
+    failed_files = copy_objects(s3c, bucket_name, [(file[0], file[1]) for file in files])
 
-    for obj in bucket.objects.all():
-        key = obj.key
-        if (
-            len(key.split("/")) == 3
-            and key.split("/")[1] == "input"
-            and key.split("/")[2] != ""
-        ):
-            s3c.delete_object(Bucket=bucket_name, Key=key)
+    # delete the archived files together with the rest of the input subfolder
+    to_delete = [file[0] for file in files if file[0] not in failed_files]
+    to_delete += [key for key in list_input_files(s3c, bucket_name) if key not in to_delete]
+    failed_deletes = [error["Key"] for error in delete_keys(s3c, bucket_name, to_delete)]
 
     return {
         "function_name": "Bolt-PO-CleanUp",
         "files failed to save": failed_files,
+        "files failed to delete": failed_deletes,
     }
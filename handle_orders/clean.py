@@ -1,38 +1,15 @@
-import io, os
 import pytz
 import logging
 import boto3
 
-from datetime import datetime, timedelta
+from datetime import datetime
+from s3_tools import copy_objects
+from retention import RETENTION_POLICY, apply_retention
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
 
 
-def delete_all_in_folder(bucket_name, folder_prefix, age):
-    s3 = boto3.client("s3")
-
-    threshold_date = datetime.now(pytz.timezone("Europe/Bucharest")) - timedelta(days=age)
-    
-    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=folder_prefix)
-    if 'Contents' in response:
-        objects = [
-            {'Key': obj['Key']} 
-            for obj in response['Contents']
-            if (obj['LastModified'] < threshold_date) & (os.path.basename(obj['Key']) != '')
-            ]
-
-        # Delete the objects
-        if len(objects) > 0:
-            delete_response = s3.delete_objects(
-                Bucket=bucket_name,
-                Delete={'Objects': objects}
-            )
-        else:
-            logger.info(f"Nothing to delete in: {folder_prefix}")
-    return
-
-
 def handler(event, context):
     # add runtime date to Bulk and MailBag files
     today = datetime.now(pytz.timezone("Europe/Bucharest"))
@@ -60,49 +37,41 @@ def handler(event, context):
 
     s3c = boto3.client("s3")
 
-    # Change files names, save the files to archive folder and delete the rest of them
-    failed_files = []
+    # in dry-run mode nothing is archived or deleted, we only report the retention plan
+    dry_run = bool(event.get("dry_run", False))
+    # what gets deleted is decided here only, never by the invocation payload
+    if "retention_policy" in event:
+        logger.warning("retention_policy of the event ignored, the module policy applies")
+
+    # Change files names and copy the files server-side to the archive folder
     for file in files:
         if file[0] == "purchasing-orders/zip-archive/Bulk PO.zip":
             file[0] = file[0].replace(" ", "")
             file[1] = file[0].split(".")[0] + f"({today})." + file[0].split(".")[1]
-        try:
-            obj = s3c.get_object(Bucket=BUCKET, Key=file[0])
-            body = io.BytesIO(obj["Body"].read())
-            s3c.put_object(
-                Body=body.getvalue(),
-                Bucket=BUCKET,
-                Key=file[1],
-            )
-        except:
-            failed_files.append(file[0])
-            continue
 
-        s3c.delete_object(Bucket=BUCKET, Key=file[0])
+    failed_files = [] if dry_run else copy_objects(s3c, BUCKET, files)
 
-    # delete the rest of the files in the input subfolder
-    input_prefix = "purchasing-orders/input/"
-    delete_all_in_folder(BUCKET, input_prefix, 0)
-    
-    # delete all the files in the wrk subfolder
-    wrk_prefix = "purchasing-orders/wrk/"
-    delete_all_in_folder(BUCKET, wrk_prefix, 0)
-    
-    # delete all files from zip-archive subfolder if older than 30 days
-    zip_prefix = "purchasing-orders/zip-archive/"
-    delete_all_in_folder(BUCKET, zip_prefix, 30)
+    # one listing of the purchasing-orders folder, the archived originals go
+    # together with the rest of the input and wrk files
+    retention = apply_retention(
+        s3c, BUCKET, RETENTION_POLICY, datetime.now(pytz.timezone("Europe/Bucharest")), dry_run=dry_run
+    )
+
+    failed_files += [f"{error['Key']}: {error['Message']}" for error in retention["errors"]]
     
     if len(failed_files) > 0:
         response = {
             "function_name": "Bolt-PO-s3Cleaner",
             "error_message": "Some files have not been processed.",
-            "error_details": failed_files
+            "error_details": failed_files,
+            "retention": retention["rules"],
             }
     else:
         response = {
             "function_name": "Bolt-PO-s3Cleaner",
             "error_message": None,
-            "error_details": None
+            "error_details": None,
+            "retention": retention["rules"],
             }
     
     return response
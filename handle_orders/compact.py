@@ -0,0 +1,192 @@
+""" function rolls the archived runtime files into one compressed bundle per day (or month)
+
+    every member of the bundle is stored as its own gzip stream, so the whole
+    bundle stays a valid .gz file while a single member can be read back with
+    one ranged GET, using the offsets stored in the bundle index:
+
+    purchasing-orders/archive-bundles/2024-05-17.bundle.gz
+    purchasing-orders/archive-bundles/2024-05-17.index.json
+
+    function accepts an optional payload:
+
+    {
+        "period": "day",  --- or "month" ---
+        "dry_run": false
+    }
+
+"""
+
+import gzip
+import json
+import logging
+import pytz
+import boto3
+
+from datetime import datetime
+from logging import INFO
+from tempfile import SpooledTemporaryFile
+from s3_tools import delete_keys, list_objects
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+BUCKET = "bolt-projects"
+ARCHIVE_PREFIX = "purchasing-orders/zip-archive/"
+BUNDLE_PREFIX = "purchasing-orders/archive-bundles/"
+
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+TIMEZONE = pytz.timezone("Europe/Bucharest")
+
+# bundles are kept in memory up to this size, then spilled to /tmp
+SPOOL_SIZE = 64 * 1024 ** 2
+
+
+def bundle_keys(period):
+    return (
+        f"{BUNDLE_PREFIX}{period}.bundle.gz",
+        f"{BUNDLE_PREFIX}{period}.index.json",
+    )
+
+
+def read_index(s3, bucket, period):
+    """ returns the index of the period bundle or None if there is no bundle yet """
+    _, index_key = bundle_keys(period)
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=index_key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj["Body"].read())
+
+
+def fetch_member(s3, bucket, period, name, index=None):
+    """ returns the content of one archived file with a single ranged GET """
+    if index is None:
+        index = read_index(s3, bucket, period)
+    if index is None:
+        raise KeyError(f"No archive bundle for {period}")
+
+    members = [member for member in index["members"] if member["name"] == name]
+    if len(members) == 0:
+        raise KeyError(f"{name} is not part of the {period} bundle")
+    member = members[0]
+
+    obj = s3.get_object(
+        Bucket=bucket,
+        Key=index["bundle"],
+        Range=f"bytes={member['offset']}-{member['offset'] + member['length'] - 1}",
+    )
+    return gzip.decompress(obj["Body"].read())
+
+
+def _group_by_period(objects, period_format, current_period):
+    """ groups the archived objects by period, skipping the period still in progress """
+    groups = {}
+    for obj in objects:
+        if obj["Key"].endswith("/"):
+            continue
+        period = obj["LastModified"].astimezone(TIMEZONE).strftime(period_format)
+        if period >= current_period:
+            continue
+        groups.setdefault(period, []).append(obj)
+    return groups
+
+
+def compact_period(s3, bucket, period, objects):
+    """ appends the objects to the period bundle and rewrites its index
+
+        returns the keys that made it into the bundle
+    """
+    bundle_key, index_key = bundle_keys(period)
+    index = read_index(s3, bucket, period)
+
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as bundle:
+        if index is None:
+            index = {"bundle": bundle_key, "period": period, "members": []}
+        else:
+            # carry over the existing bundle, offsets stay valid
+            s3.download_fileobj(bucket, bundle_key, bundle)
+            bundle.seek(0, 2)
+
+        known = {member["name"] for member in index["members"]}
+        compacted = []
+        for obj in sorted(objects, key=lambda obj: obj["LastModified"]):
+            name = obj["Key"][len(ARCHIVE_PREFIX):]
+            if name in known:
+                # already bundled by a previous run that did not get to delete it
+                compacted.append(obj["Key"])
+                continue
+
+            content = s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+            member = gzip.compress(content)
+            offset = bundle.tell()
+            bundle.write(member)
+
+            index["members"].append({
+                "name": name,
+                "key": obj["Key"],
+                "offset": offset,
+                "length": len(member),
+                "size": len(content),
+                "last_modified": obj["LastModified"].isoformat(),
+            })
+            compacted.append(obj["Key"])
+
+        bundle.seek(0)
+        s3.upload_fileobj(
+            bundle, bucket, bundle_key, ExtraArgs={"ContentType": "application/gzip"}
+        )
+
+    # the index is written last, a reader never sees offsets beyond the bundle
+    s3.put_object(
+        Bucket=bucket,
+        Key=index_key,
+        Body=json.dumps(index).encode("utf-8"),
+        ContentType="application/json",
+    )
+    return compacted
+
+
+def handler(event, context):
+    period_type = event.get("period", "day")
+    dry_run = bool(event.get("dry_run", False))
+
+    if period_type not in PERIOD_FORMATS:
+        return {
+            "function_name": "Bolt-PO-ArchiveCompactor",
+            "error_message": f"Unknown period: {period_type}",
+            "error_details": None,
+        }
+    period_format = PERIOD_FORMATS[period_type]
+    current_period = datetime.now(TIMEZONE).strftime(period_format)
+
+    s3 = boto3.client("s3")
+
+    groups = _group_by_period(
+        list_objects(s3, BUCKET, ARCHIVE_PREFIX), period_format, current_period
+    )
+    logger.info(f"Found {len(groups)} {period_type}s to compact")
+
+    bundles = {}
+    failed = []
+    for period, objects in sorted(groups.items()):
+        if dry_run:
+            bundles[period] = len(objects)
+            continue
+        try:
+            compacted = compact_period(s3, BUCKET, period, objects)
+        except Exception as err:
+            logger.error(f"Compaction of {period} failed: {str(err)}")
+            failed.append(f"{period}: {str(err)}")
+            continue
+
+        errors = delete_keys(s3, BUCKET, compacted)
+        failed += [f"{error['Key']}: {error['Message']}" for error in errors]
+        bundles[period] = len(compacted)
+        logger.info(f"{period}: {len(compacted)} files bundled")
+
+    return {
+        "function_name": "Bolt-PO-ArchiveCompactor",
+        "error_message": "Some periods have not been compacted." if len(failed) > 0 else None,
+        "error_details": failed if len(failed) > 0 else None,
+        "bundles": bundles,
+    }
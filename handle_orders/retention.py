@@ -0,0 +1,113 @@
+""" retention policy applied by the cleaner to the purchasing-orders folder
+
+    the policy is a list of rules, each one scoped to a prefix:
+
+    {
+        "prefix": "purchasing-orders/zip-archive/",
+        "max_age_days": 30,        --- delete objects older than this, None keeps them forever ---
+        "keep_last": 5,            --- always keep the newest N objects of the prefix ---
+        "keep_pattern": "*.json",  --- never delete objects whose name matches this glob ---
+    }
+
+    an object is governed by the rule with the longest matching prefix, objects
+    not matched by any rule are left untouched
+"""
+
+import logging
+
+from datetime import timedelta
+from fnmatch import fnmatch
+from logging import INFO
+from s3_tools import delete_keys, list_objects
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+RETENTION_ROOT = "purchasing-orders/"
+
+RETENTION_POLICY = [
+    {"prefix": "purchasing-orders/input/", "max_age_days": 0},
+    {"prefix": "purchasing-orders/wrk/", "max_age_days": 0},
+    {"prefix": "purchasing-orders/zip-archive/", "max_age_days": 30},
+    {"prefix": "purchasing-orders/archive-bundles/", "max_age_days": 365},
+    {"prefix": "purchasing-orders/runs/", "max_age_days": 7, "keep_pattern": "latest-*.json"},
+]
+
+
+def _match_rule(key, rules):
+    matches = [rule for rule in rules if key.startswith(rule["prefix"])]
+    if len(matches) == 0:
+        return None
+    return max(matches, key=lambda rule: len(rule["prefix"]))
+
+
+def plan_deletions(objects, policy, now):
+    """ evaluates every rule of the policy against the listed objects
+
+        returns a dict prefix -> keys to delete
+    """
+    grouped = {rule["prefix"]: [] for rule in policy}
+    for obj in objects:
+        # skip the "folder" placeholder keys
+        if obj["Key"].endswith("/"):
+            continue
+        rule = _match_rule(obj["Key"], policy)
+        if rule is not None:
+            grouped[rule["prefix"]].append(obj)
+
+    plan = {}
+    for rule in policy:
+        candidates = sorted(
+            grouped[rule["prefix"]], key=lambda obj: obj["LastModified"], reverse=True
+        )
+        keep_last = rule.get("keep_last") or 0
+        candidates = candidates[keep_last:]
+
+        max_age = rule.get("max_age_days")
+        if max_age is not None:
+            threshold_date = now - timedelta(days=max_age)
+            candidates = [obj for obj in candidates if obj["LastModified"] < threshold_date]
+        elif keep_last == 0:
+            # neither an age nor a count limit, nothing to enforce
+            candidates = []
+
+        pattern = rule.get("keep_pattern")
+        if pattern:
+            candidates = [
+                obj for obj in candidates if not fnmatch(obj["Key"].split("/")[-1], pattern)
+            ]
+
+        plan[rule["prefix"]] = [obj["Key"] for obj in candidates]
+
+    return plan
+
+
+def apply_retention(s3, bucket, policy, now, dry_run=False, root=RETENTION_ROOT):
+    """ lists root once, evaluates the policy and deletes the planned keys
+
+        in dry_run mode nothing is deleted and the report lists the keys that
+        would have been deleted
+    """
+    objects = list(list_objects(s3, bucket, root))
+    plan = plan_deletions(objects, policy, now)
+
+    report = {
+        "listed": len(objects),
+        "dry_run": dry_run,
+        "rules": {prefix: {"to_delete": len(keys)} for prefix, keys in plan.items()},
+        "errors": [],
+    }
+    for prefix, keys in plan.items():
+        logger.info(f"Retention for {prefix}: {len(keys)} objects to delete")
+
+    if dry_run:
+        for prefix, keys in plan.items():
+            report["rules"][prefix]["keys"] = keys
+        return report
+
+    keys = [key for prefix_keys in plan.values() for key in prefix_keys]
+    report["errors"] = delete_keys(s3, bucket, keys)
+    for error in report["errors"]:
+        logger.error(f"Could not delete {error['Key']}: {error['Message']}")
+
+    return report
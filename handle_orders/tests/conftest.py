@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the lambda modules import each other from the handle_orders folder, and the
+# modules of the shared layer from shared/python
+sys.path.insert(0, os.path.join(ROOT, "shared", "python"))
+sys.path.insert(0, os.path.join(ROOT, "handle_orders"))
@@ -0,0 +1,25 @@
+""" cleaner handler, run with: pytest handle_orders/tests """
+
+import boto3
+
+from moto import mock_aws
+
+BUCKET = "bolt-projects"
+
+
+def test_event_cannot_widen_the_retention_policy(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-central-1")
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+        s3.put_object(Bucket=BUCKET, Key="purchasing-orders/templates/cadentar.xlsx", Body=b"x")
+        s3.put_object(Bucket=BUCKET, Key="purchasing-orders/zip-archive/Bulk PO(01-05-2024T06:00).zip", Body=b"x")
+
+        import clean
+        clean.handler({"retention_policy": [{"prefix": "purchasing-orders/", "max_age_days": 0}]}, None)
+
+        keys = sorted(obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET)["Contents"])
+        assert keys == [
+            "purchasing-orders/templates/cadentar.xlsx",
+            "purchasing-orders/zip-archive/Bulk PO(01-05-2024T06:00).zip",
+        ]
@@ -0,0 +1,148 @@
+""" retention plan of the cleaner, run with: pytest handle_orders/tests """
+
+import boto3
+import pytest
+
+from datetime import datetime, timedelta, timezone
+from moto import mock_aws
+from retention import RETENTION_POLICY, apply_retention, plan_deletions
+
+NOW = datetime(2024, 5, 17, 6, 0, tzinfo=timezone.utc)
+BUCKET = "bolt-projects"
+
+
+def obj(key, days_old):
+    return {"Key": key, "LastModified": NOW - timedelta(days=days_old)}
+
+
+def test_max_age_deletes_only_older_objects():
+    policy = [{"prefix": "purchasing-orders/zip-archive/", "max_age_days": 30}]
+    objects = [
+        obj("purchasing-orders/zip-archive/old.zip", 31),
+        obj("purchasing-orders/zip-archive/new.zip", 29),
+    ]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert plan == {"purchasing-orders/zip-archive/": ["purchasing-orders/zip-archive/old.zip"]}
+
+
+def test_max_age_zero_deletes_everything_older_than_now():
+    policy = [{"prefix": "purchasing-orders/input/", "max_age_days": 0}]
+    objects = [obj("purchasing-orders/input/Bulk PO.zip", 0.01), obj("purchasing-orders/input/MailBag.csv", 2)]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert sorted(plan["purchasing-orders/input/"]) == [
+        "purchasing-orders/input/Bulk PO.zip",
+        "purchasing-orders/input/MailBag.csv",
+    ]
+
+
+def test_keep_last_keeps_the_newest_objects_even_when_old():
+    policy = [{"prefix": "p/", "max_age_days": 1, "keep_last": 2}]
+    objects = [obj("p/a", 10), obj("p/b", 20), obj("p/c", 30), obj("p/d", 40)]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert plan == {"p/": ["p/c", "p/d"]}
+
+
+def test_keep_last_without_max_age_deletes_beyond_the_count():
+    policy = [{"prefix": "p/", "max_age_days": None, "keep_last": 1}]
+    objects = [obj("p/a", 3), obj("p/b", 1), obj("p/c", 2)]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert sorted(plan["p/"]) == ["p/a", "p/c"]
+
+
+def test_no_age_and_no_count_keeps_everything():
+    policy = [{"prefix": "p/", "max_age_days": None}]
+
+    plan = plan_deletions([obj("p/a", 1000)], policy, NOW)
+
+    assert plan == {"p/": []}
+
+
+def test_keep_pattern_matches_the_file_name():
+    policy = [{"prefix": "purchasing-orders/runs/", "max_age_days": 7, "keep_pattern": "latest-*.json"}]
+    objects = [
+        obj("purchasing-orders/runs/latest-mov.json", 30),
+        obj("purchasing-orders/runs/latest-export.json", 30),
+        obj("purchasing-orders/runs/20240401T060000-1a2b3c/state.json", 30),
+        obj("purchasing-orders/runs/20240516T060000-4d5e6f/state.json", 1),
+    ]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert plan == {"purchasing-orders/runs/": ["purchasing-orders/runs/20240401T060000-1a2b3c/state.json"]}
+
+
+def test_longest_prefix_governs_the_object():
+    policy = [
+        {"prefix": "purchasing-orders/", "max_age_days": 0},
+        {"prefix": "purchasing-orders/zip-archive/", "max_age_days": 30},
+    ]
+    objects = [obj("purchasing-orders/zip-archive/a.zip", 10), obj("purchasing-orders/other.csv", 10)]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert plan == {
+        "purchasing-orders/": ["purchasing-orders/other.csv"],
+        "purchasing-orders/zip-archive/": [],
+    }
+
+
+def test_unmatched_objects_and_folder_keys_are_left_alone():
+    policy = [{"prefix": "purchasing-orders/wrk/", "max_age_days": 0}]
+    objects = [obj("purchasing-orders/wrk/", 10), obj("purchasing-orders/templates/a.xlsx", 10)]
+
+    plan = plan_deletions(objects, policy, NOW)
+
+    assert plan == {"purchasing-orders/wrk/": []}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-central-1")
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "eu-central-1"})
+        for key in [
+            "purchasing-orders/input/Bulk PO.zip",
+            "purchasing-orders/wrk/mov.csv",
+            "purchasing-orders/zip-archive/Bulk PO(01-05-2024T06:00).zip",
+            "purchasing-orders/runs/latest-mov.json",
+            "purchasing-orders/templates/cadentar.xlsx",
+        ]:
+            client.put_object(Bucket=BUCKET, Key=key, Body=b"x")
+        yield client
+
+
+def _keys(s3):
+    return sorted(obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET).get("Contents", []))
+
+
+def test_dry_run_deletes_nothing_and_reports_the_plan(s3):
+    now = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    report = apply_retention(s3, BUCKET, RETENTION_POLICY, now, dry_run=True)
+
+    assert len(_keys(s3)) == 5
+    assert report["rules"]["purchasing-orders/input/"]["keys"] == ["purchasing-orders/input/Bulk PO.zip"]
+    assert report["rules"]["purchasing-orders/zip-archive/"]["to_delete"] == 0
+
+
+def test_apply_retention_deletes_the_planned_keys(s3):
+    # 8 days on, the archived zip is still within its 30 days and latest-mov.json is kept
+    now = datetime.now(timezone.utc) + timedelta(days=8)
+
+    report = apply_retention(s3, BUCKET, RETENTION_POLICY, now)
+
+    assert report["errors"] == []
+    assert _keys(s3) == [
+        "purchasing-orders/runs/latest-mov.json",
+        "purchasing-orders/templates/cadentar.xlsx",
+        "purchasing-orders/zip-archive/Bulk PO(01-05-2024T06:00).zip",
+    ]
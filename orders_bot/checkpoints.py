@@ -0,0 +1,144 @@
+""" checkpoints of the scraper phases, so a failed run can resume where it stopped
+
+    every run has an id and keeps its state and outputs under
+
+    purchasing-orders/runs/{run_id}/state.json
+    {
+        "run_id": "20240517T060000-1a2b3c",
+        "status": "running",        --- "failed" or "done" ---
+        "current": "download",
+        "error": null,
+        "phases": {
+            "login": {"done_at": "...", "seconds": 4.2, "outputs": {}},
+            "mov": {"done_at": "...", "seconds": 31.0, "outputs": {"files": ["mov_data.csv"]}}
+        }
+    }
+    purchasing-orders/runs/{run_id}/mov_data.csv
+    purchasing-orders/runs/{run_id}/Bulk PO.zip
+
+    purchasing-orders/runs/latest-{job}.json points to the last started run of
+    each job, "mov" or "export". jobs run in separate invocations have their own
+    last run
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+
+from datetime import datetime, timezone
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+BUCKET = "bolt-projects"
+RUNS_PREFIX = "purchasing-orders/runs/"
+PHASES = ["login", "mov", "export_config", "download", "upload"]
+
+
+def new_run_id():
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def latest_key(job):
+    return f"{RUNS_PREFIX}latest-{job}.json"
+
+
+def latest_run_id(s3, job, bucket=BUCKET):
+    """ the last started run of the job, None when there is none """
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=latest_key(job))
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj["Body"].read())["run_id"]
+
+
+class RunState:
+    """ state of one run, kept in memory only when s3 is None """
+
+    def __init__(self, run_id=None, s3=None, bucket=BUCKET):
+        self.s3 = s3
+        self.bucket = bucket
+        self.run_id = run_id or new_run_id()
+        self.prefix = f"{RUNS_PREFIX}{self.run_id}/"
+        self.started = {}
+        self.is_new = False
+
+        self.state = None
+        if s3 is not None:
+            try:
+                obj = s3.get_object(Bucket=bucket, Key=self.prefix + "state.json")
+                self.state = json.loads(obj["Body"].read())
+                logger.info(f"Resuming run {self.run_id}, done: {self.done_phases()}")
+            except s3.exceptions.NoSuchKey:
+                pass
+        if self.state is None:
+            self.state = {"run_id": self.run_id, "status": "running", "current": None, "error": None, "phases": {}}
+            self.is_new = True
+        self.state["status"] = "running"
+
+    def set_jobs(self, jobs):
+        """ records the jobs of the run, a new run becomes the last started run of each of them """
+        self.state["jobs"] = list(jobs)
+        if self.is_new and self.s3 is not None:
+            for job in jobs:
+                self.s3.put_object(Bucket=self.bucket, Key=latest_key(job), Body=json.dumps({"run_id": self.run_id}))
+
+    def _save(self):
+        if self.s3 is not None:
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=self.prefix + "state.json",
+                Body=json.dumps(self.state, indent=2),
+                ContentType="application/json",
+            )
+
+    def done_phases(self):
+        return [phase for phase in PHASES if phase in self.state["phases"]]
+
+    def is_done(self, phase):
+        return phase in self.state["phases"]
+
+    def start(self, phase):
+        self.started[phase] = time.perf_counter()
+        self.state["current"] = phase
+
+    def complete(self, phase, directory=None, files=(), outputs=None):
+        """ saves the phase output files under the run, then marks the phase done """
+        outputs = dict(outputs or {})
+        if len(files) > 0:
+            outputs["files"] = list(files)
+            if self.s3 is not None:
+                for name in files:
+                    self.s3.upload_file(os.path.join(directory, name), self.bucket, self.prefix + name)
+
+        seconds = time.perf_counter() - self.started.get(phase, time.perf_counter())
+        self.state["phases"][phase] = {
+            "done_at": datetime.now(timezone.utc).isoformat(),
+            "seconds": round(seconds, 3),
+            "outputs": outputs,
+        }
+        self._save()
+        logger.info(f"Phase {phase} done in {seconds:.1f} s")
+
+    def restore(self, phase, directory):
+        """ downloads the output files of a phase done by an earlier attempt """
+        for name in self.state["phases"][phase]["outputs"].get("files", []):
+            self.s3.download_file(self.bucket, self.prefix + name, os.path.join(directory, name))
+        logger.info(f"Phase {phase} restored from run {self.run_id}")
+
+    def fail(self, error):
+        self.state["status"] = "failed"
+        self.state["error"] = error
+        self._save()
+
+    def finish(self):
+        self.state["status"] = "done"
+        self.state["current"] = None
+        self.state["error"] = None
+        self._save()
+
+    def summary(self):
+        return {phase: self.state["phases"][phase]["seconds"] for phase in self.done_phases()}
@@ -0,0 +1,159 @@
+""" download completion detection for the browser exports
+
+    Chrome writes a download as "<name>.crdownload" and renames it to <name> once
+    complete. the watcher listens for that rename (IN_MOVED_TO) or for the final
+    file being closed (IN_CLOSE_WRITE) through inotify, so the wait ends the moment
+    the file is complete. where inotify is not available it polls the folder
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+import zipfile
+
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len of struct inotify_event
+
+POLL_INTERVAL = 0.2  # in seconds, used without inotify
+MIN_ZIP_SIZE = 22  # in bytes, the size of an empty zip archive
+
+
+class DownloadException(Exception): pass
+
+
+def _inotify():
+    """ returns the libc inotify functions, or None when they are not available """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+
+def clear_stale(*paths):
+    """ removes the files and their partial downloads left by a previous run of a warm container """
+    for path in paths:
+        for stale in (path, path + ".crdownload"):
+            if os.path.exists(stale):
+                os.remove(stale)
+                logger.info(f"Removed stale {stale}")
+
+
+def verify_zip(path, min_size=MIN_ZIP_SIZE):
+    """ raises DownloadException unless path is a complete, readable zip archive """
+    size = os.path.getsize(path)
+    if size < min_size:
+        raise DownloadException(f"{os.path.basename(path)} is too small: {size} bytes")
+    if not zipfile.is_zipfile(path):
+        raise DownloadException(f"{os.path.basename(path)} is not a zip archive")
+    try:
+        with zipfile.ZipFile(path) as archive:
+            broken = archive.testzip()
+    except (zipfile.BadZipFile, OSError) as err:
+        raise DownloadException(f"{os.path.basename(path)} is not readable: {str(err)}")
+    if broken is not None:
+        raise DownloadException(f"{os.path.basename(path)} has a corrupt member: {broken}")
+    return size
+
+
+class DownloadWatcher:
+    """ start it before the download is triggered, so the completion event is not missed
+
+        with DownloadWatcher("/tmp") as watcher:
+            proceed.click()
+            watcher.wait("Bulk PO.zip", timeout=30)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.started = time.perf_counter()
+        self.fd = None
+
+        functions = _inotify()
+        if functions is not None:
+            inotify_init1, inotify_add_watch = functions
+            fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0 and inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                self.fd = fd
+            elif fd >= 0:
+                os.close(fd)
+        if self.fd is None:
+            logger.info("inotify not available, polling for the download")
+
+    def _is_complete(self, path):
+        return os.path.exists(path) and not os.path.exists(path + ".crdownload")
+
+    def _events(self, timeout):
+        """ names of the files completed in the folder within timeout seconds """
+        readable, _, _ = select.select([self.fd], [], [], max(0, timeout))
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            names.append(data[offset:offset + length].rstrip(b"\0").decode())
+            offset += length
+        return names
+
+    def _poll(self, path, deadline):
+        """ the file is complete and its size stopped changing """
+        last_size = None
+        while time.perf_counter() < deadline:
+            if self._is_complete(path):
+                size = os.path.getsize(path)
+                if size == last_size:
+                    return True
+                last_size = size
+            time.sleep(POLL_INTERVAL)
+        return False
+
+    def wait(self, name, timeout, min_size=MIN_ZIP_SIZE):
+        """ waits for the download to complete and verifies the archive
+
+            returns {"path", "size", "seconds", "method"}, seconds counted from the
+            watcher start. raises DownloadException on timeout or a broken archive
+        """
+        path = os.path.join(self.directory, name)
+        deadline = time.perf_counter() + timeout
+
+        if self.fd is not None:
+            method = "inotify"
+            is_complete = self._is_complete(path)
+            while not is_complete and time.perf_counter() < deadline:
+                if name in self._events(deadline - time.perf_counter()):
+                    is_complete = self._is_complete(path)
+        else:
+            method = "polling"
+            is_complete = self._poll(path, deadline)
+
+        if not is_complete:
+            raise DownloadException(f"{name} not downloaded within {timeout} s")
+
+        seconds = round(time.perf_counter() - self.started, 3)
+        size = verify_zip(path, min_size)
+        logger.info(f"{name} downloaded in {seconds} s, {size} bytes ({method})")
+        return {"path": path, "size": size, "seconds": seconds, "method": method}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
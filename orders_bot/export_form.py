@@ -0,0 +1,276 @@
+""" configuration of the Bulk PO export form with a few batched scripts
+
+    the desired state of the form is applied in the page instead of element by
+    element over WebDriver, then read back for verification:
+
+    {
+        "fields": {"po_number": true, "price": false, ...},  --- only these checkboxes are touched ---
+        "cities": ["Cluj-Napoca", ...],
+        "all_stores": true,
+        "all_suppliers": true
+    }
+
+    the multi selects are read back from the checkbox, aria-checked or aria-selected
+    marker of their options. an option without any of them reads as null, its
+    selection is then taken from the clicks of the script. a field the modal does
+    not show is reported by missing_fields, not as a difference
+"""
+
+from wms_http import CITIES, REPORT_FIELDS
+
+WAIT_TIME = 10  # in seconds, max time of one wait within a selection script
+SCRIPT_TIME = 120  # in seconds, max time of a whole selection script
+SETTLE_TIME = 1  # in seconds, time a list needs to render after a click or a scroll
+
+# the other report fields of the modal, they are cleared. provicer_id is the
+# name the WMS gives the provider id checkbox
+CLEARED_FIELDS = [
+    "store_address",
+    "price",
+    "fact_qty",
+    "supplier_id",
+    "edi_store_code",
+    "edi_supplier_code",
+    "created_date",
+    "total_sum",
+    "total_with_vat_sum",
+]
+
+FORM_STATE = {
+    "fields": {**{name: True for name in REPORT_FIELDS}, **{name: False for name in CLEARED_FIELDS}},
+    "cities": CITIES,
+    "all_stores": True,
+    "all_suppliers": True,
+}
+SELECTS = ["cities", "stores", "suppliers"]
+
+CITY_TOGGLE_XPATH = '//*[@id="city-multi-select-toggle-button"]'
+STORE_TOGGLE_XPATH = '//*[@id="storeSelectBox"]/div/div/div/div[2]/button'
+STORE_LIST_XPATH = '//div[@id="store-select-menu"]/div/div/ul/li'
+SUPPLIER_TOGGLE_XPATH = '//*[@id="supplierSelectBox"]/div/div/div/div/div[2]/button'
+SUPPLIER_LIST_XPATH = '//div[@id="supplier-select-menu"]/div/div/ul/li'
+SUPPLIER_MODAL_XPATH = '//div[@data-overlay-container="true"]/div/div'
+
+# clears "Select all", then clicks the known field checkboxes whose state differs from the wanted one
+SET_FIELDS_SCRIPT = """
+const wanted = arguments[0];
+const boxes = Array.from(document.querySelectorAll('input[type="checkbox"]'));
+const selectAll = boxes.find(box => box.name === "Select all");
+if (selectAll && selectAll.checked) { selectAll.click(); }
+for (const box of boxes) {
+    if (box.name in wanted && box.checked !== wanted[box.name]) { box.click(); }
+}
+"""
+
+FIELDS_STATE_SCRIPT = """
+const names = arguments[0];
+const state = {};
+for (const box of document.querySelectorAll('input[type="checkbox"]')) {
+    if (names.includes(box.name)) { state[box.name] = box.checked; }
+}
+return state;
+"""
+
+# opens a multi select and clicks the wanted items, or all of them, that are not
+# selected yet: a click toggles. a virtual list is scrolled until a scroll neither
+# moves it nor shows a new item. the selection of every item is then read back,
+# the select closed with its toggle and both returned
+SELECT_OPTIONS_SCRIPT = """
+const [toggleXPath, itemsXPath, wanted, skip, scrollXPath, timeoutMs, settleMs] = arguments;
+const done = arguments[arguments.length - 1];
+const find = xpath => document.evaluate(
+    xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+const findAll = xpath => {
+    const found = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({length: found.snapshotLength}, (_, i) => found.snapshotItem(i));
+};
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const waitFor = async (condition, ms = timeoutMs) => {
+    const deadline = Date.now() + ms;
+    while (Date.now() < deadline) {
+        if (condition()) { return true; }
+        await sleep(50);
+    }
+    return condition();
+};
+const textOf = item => item.textContent.trim();
+const isSelected = item => {
+    // the item found may be the text inside the option
+    const option = item.closest('li, [role="option"]') || item;
+    const box = option.querySelector('input[type="checkbox"]');
+    if (box) { return box.checked; }
+    for (const name of ["aria-checked", "aria-selected"]) {
+        const marked = option.hasAttribute(name) ? option : option.querySelector(`[${name}]`);
+        if (marked) { return marked.getAttribute(name) === "true"; }
+    }
+    return null;
+};
+
+(async () => {
+    find(toggleXPath).click();
+    const expected = wanted ? wanted.length : 1;
+    if (!await waitFor(() => findAll(itemsXPath).length >= expected)) {
+        throw new Error(`options not shown: ${itemsXPath}`);
+    }
+
+    const scroller = scrollXPath ? find(scrollXPath) : null;
+    // visits every item once, scrolling a virtual list down to its end
+    const walk = async visit => {
+        const visited = new Set(skip);
+        while (true) {
+            for (const item of findAll(itemsXPath)) {
+                const text = textOf(item);
+                if (visited.has(text)) { continue; }
+                visited.add(text);
+                visit(item, text);
+            }
+            if (!scroller) { return; }
+            const before = scroller.scrollTop;
+            scroller.scrollTop = before + scroller.offsetHeight;
+            const unseen = () => findAll(itemsXPath).some(item => !visited.has(textOf(item)));
+            if (!await waitFor(unseen, settleMs) && scroller.scrollTop === before) { return; }
+        }
+    };
+
+    const clicked = [];
+    await walk((item, text) => {
+        if (wanted && !wanted.includes(text)) { return; }
+        if (isSelected(item) === true) { return; }
+        item.click();
+        clicked.push(text);
+    });
+
+    await sleep(settleMs);
+    if (scroller) {
+        scroller.scrollTop = 0;
+        await sleep(settleMs);
+    }
+    const state = {};
+    await walk((item, text) => { state[text] = isSelected(item); });
+
+    find(toggleXPath).click();
+    done({clicked: clicked, state: state, error: null});
+})().catch(err => done({clicked: [], state: {}, error: String(err)}));
+"""
+
+
+class ExportFormException(Exception): pass
+
+
+def set_fields(driver, fields):
+    """ sets the known report fields to their wanted state and returns their state read back from the page """
+    driver.execute_script(SET_FIELDS_SCRIPT, dict(fields))
+    return driver.execute_script(FIELDS_STATE_SCRIPT, list(fields))
+
+
+def select_options(driver, toggle, items, wanted=None, skip=(), scroll=None, timeout=WAIT_TIME):
+    """ clicks the wanted options of a multi select, all of them when wanted is None
+
+        returns {"clicked": [texts], "state": {text: true, false or None when not readable}}
+    """
+    # the timeout is the driver's, the later scripts get theirs back
+    script_time = driver.timeouts.script
+    driver.set_script_timeout(SCRIPT_TIME)
+    try:
+        result = driver.execute_async_script(
+            SELECT_OPTIONS_SCRIPT,
+            toggle,
+            items,
+            None if wanted is None else list(wanted),
+            list(skip),
+            scroll,
+            timeout * 1000,
+            SETTLE_TIME * 1000,
+        )
+    finally:
+        driver.set_script_timeout(script_time)
+    if result["error"] is not None:
+        raise ExportFormException(result["error"])
+    return {"clicked": result["clicked"], "state": result["state"]}
+
+
+def _text_xpath(texts):
+    return "//*[" + " or ".join(f'text()="{text}"' for text in texts) + "]"
+
+
+def apply_form(driver, state=FORM_STATE, timeout=WAIT_TIME):
+    """ applies the desired state to the open export modal and returns what the page reports back """
+    applied = {"fields": set_fields(driver, state["fields"])}
+
+    applied["cities"] = select_options(
+        driver, CITY_TOGGLE_XPATH, _text_xpath(state["cities"]), wanted=state["cities"], timeout=timeout
+    )
+    applied["stores"] = {"clicked": [], "state": {}}
+    if state["all_stores"]:
+        applied["stores"] = select_options(driver, STORE_TOGGLE_XPATH, STORE_LIST_XPATH, timeout=timeout)
+    applied["suppliers"] = {"clicked": [], "state": {}}
+    if state["all_suppliers"]:
+        # the list is virtual, only the visible suppliers exist in the page
+        applied["suppliers"] = select_options(
+            driver,
+            SUPPLIER_TOGGLE_XPATH,
+            SUPPLIER_LIST_XPATH,
+            skip=["All"],
+            scroll=SUPPLIER_MODAL_XPATH,
+            timeout=timeout,
+        )
+    return applied
+
+
+def unverified(applied):
+    """ the multi selects whose options show no selection marker """
+    return [
+        key for key in SELECTS
+        if len(applied[key]["state"]) > 0 and all(value is None for value in applied[key]["state"].values())
+    ]
+
+
+def selected(options):
+    """ the options read back as selected, the clicked ones when the page does not show it """
+    if len(options["state"]) > 0 and all(value is None for value in options["state"].values()):
+        return options["clicked"]
+    return [text for text, value in options["state"].items() if value]
+
+
+def form_counts(applied):
+    return {key: len(selected(applied[key])) for key in SELECTS}
+
+
+def _check_all(name, options):
+    """ every option of the list must be selected """
+    if len(options["state"]) == 0:
+        return [f"no {name} in the list"]
+    return [
+        f"{name} {text} not selected" for text, value in options["state"].items()
+        if value is False or (value is None and text not in options["clicked"])
+    ]
+
+
+def missing_fields(state, applied):
+    """ the report fields of the desired state that the modal does not show """
+    return [name for name in state["fields"] if name not in applied["fields"]]
+
+
+def check_form(state, applied):
+    """ returns the differences between the desired and the applied state, empty when they match
+
+        the fields missing from the modal are left to missing_fields
+    """
+    problems = []
+    fields = applied["fields"]
+    for name, wanted in state["fields"].items():
+        if name in fields and fields[name] != wanted:
+            problems.append(f"field {name} is {'ticked' if fields[name] else 'cleared'}")
+
+    cities = applied["cities"]
+    for city in state["cities"]:
+        if city not in cities["state"]:
+            problems.append(f"city {city} not found")
+        elif cities["state"][city] is False or (cities["state"][city] is None and city not in cities["clicked"]):
+            problems.append(f"city {city} not selected")
+    if state["all_stores"]:
+        problems += _check_all("store", applied["stores"])
+    if state["all_suppliers"]:
+        problems += _check_all("supplier", applied["suppliers"])
+    return problems
@@ -0,0 +1,94 @@
+""" lean browsing mode: only the wms app and its data are loaded
+
+    two layers keep Chrome from fetching what the scraper never looks at:
+        - domains outside ALLOWED_DOMAINS are not resolved (--host-resolver-rules),
+          which drops analytics and third party scripts
+        - images, fonts and media of the allowed domains are blocked through CDP
+          Network.setBlockedURLs
+
+    the allowlist can be overridden with WMS_ALLOWED_DOMAINS="wms.bolt.eu,*.bolt.eu".
+    the mode is off unless WMS_LEAN=1: it has not been checked yet that the live
+    WMS login and app load from the allowed domains only
+
+    Traffic drains the performance log after every phase, so chrome does not keep
+    it for the whole run, and counts the transferred and the blocked requests
+"""
+
+import json
+import os
+
+from urllib.parse import urlparse
+
+ALLOWED_DOMAINS = os.environ.get("WMS_ALLOWED_DOMAINS", "bolt.eu,*.bolt.eu,localhost").split(",")
+
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+]
+
+NOT_RESOLVED = "net::ERR_NAME_NOT_RESOLVED"
+
+
+def host_resolver_rules(allowed=ALLOWED_DOMAINS):
+    """ every host resolves to nothing, except the allowed ones """
+    return ", ".join(["MAP * ~NOTFOUND"] + [f"EXCLUDE {domain.strip()}" for domain in allowed])
+
+
+def apply_options(options, allowed=ALLOWED_DOMAINS):
+    """ adds the domain allowlist and the performance log to the chrome options """
+    options.add_argument(f"--host-resolver-rules={host_resolver_rules(allowed)}")
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def block_resources(driver, patterns=BLOCKED_URLS):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+class Traffic:
+    """ requests and bytes transferred and requests blocked, over the drained performance log
+
+        {
+            "requests": 42,
+            "bytes": 1048576,
+            "blocked": 17,
+            "blocked_by": {"resource": 12, "domain": 5},
+            "blocked_hosts": {"www.google-analytics.com": 3, ...},
+            "failed": 0
+        }
+    """
+
+    def __init__(self):
+        self.report = {"requests": 0, "bytes": 0, "blocked": 0, "blocked_by": {}, "blocked_hosts": {}, "failed": 0}
+        # urls of the requests still loading
+        self.urls = {}
+
+    def drain(self, driver):
+        """ reads and empties the performance log of the driver """
+        report = self.report
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+
+            if method == "Network.requestWillBeSent":
+                self.urls[params["requestId"]] = params["request"]["url"]
+            elif method == "Network.loadingFinished":
+                self.urls.pop(params["requestId"], None)
+                report["requests"] += 1
+                report["bytes"] += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed":
+                url = self.urls.pop(params["requestId"], "")
+                if params.get("blockedReason"):
+                    reason = "resource"
+                elif params.get("errorText") == NOT_RESOLVED:
+                    reason = "domain"
+                else:
+                    report["failed"] += 1
+                    continue
+                report["blocked"] += 1
+                report["blocked_by"][reason] = report["blocked_by"].get(reason, 0) + 1
+                host = urlparse(url).hostname or "unknown"
+                report["blocked_hosts"][host] = report["blocked_hosts"].get(host, 0) + 1
+        return report
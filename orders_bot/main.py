@@ -1,28 +1,49 @@
 import logging
-import csv, json, os
+import csv, os
 import boto3
 
-from time import sleep
 from datetime import datetime
 from botocore.exceptions import ClientError
 from tempfile import mkdtemp
+from secrets_provider import get_provider
+from mov import PAGE_TITLE_XPATH, STORE_TOGGLE_XPATH, TOMORROW_TAB_XPATH, read_mov_table, read_stores_in_tabs
+from waits import Waits, install_network_hook
+from downloads import DownloadException, DownloadWatcher, clear_stale, verify_zip
+from export_form import FORM_STATE, STORE_LIST_XPATH, apply_form, check_form, form_counts, missing_fields, unverified
+import lean
+from checkpoints import RunState, latest_run_id
+from tracing import StepHandler, Tracer
+import session_cache
+from wms_http import WmsClient, WmsHttpException, run as run_http
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 import selenium.common.exceptions as Exceptions
 
-WMS_URL = "https://wms.bolt.eu"
+WMS_URL = os.environ.get("WMS_URL", "https://wms.bolt.eu")  # replay.py points it to a local server
+ENGINES = ["auto", "http", "selenium"]
+ENGINE = os.environ.get("WMS_ENGINE", "auto")
 DOWNLOAD_DIR = "/tmp"
 WAIT_TIME = 10
+DOWNLOAD_TIME = int(os.environ.get("WMS_DOWNLOAD_TIMEOUT", 30))  # in seconds, max wait for the Bulk PO export
+BULK_PO_FILE = "Bulk PO.zip"
+MOV_FILE = "mov_data.csv"
+JOBS = ["mov", "export"]
+JOB_PHASES = {"mov": "mov", "export": "download"}  # the phase producing the file of each job
+JOB_FILES = {"mov": MOV_FILE, "export": BULK_PO_FILE}
+TRACING = os.environ.get("WMS_TRACE", "1") == "1"  # save a chrome://tracing trace of every run
+LEAN_MODE = os.environ.get("WMS_LEAN", "0") == "1"  # block assets and foreign domains, see lean.py
+MOV_TABS = int(os.environ.get("WMS_MOV_TABS", 1))  # tabs reading the stores' mov tables concurrently
+SESSION_CHECK_TIME = 5  # in seconds, max wait for the app to open with a saved session
+
+LOGIN_BUTTON_XPATH = '//*[@id="root"]/div/div[1]/div/div[2]/div/form/button'
+DELIVERY_LINK_XPATH = '//*[@id="main-content-box"]/div/aside/div[2]/div/div[1]/ul[1]/li[8]/a'
 
 options = webdriver.ChromeOptions()
-service = webdriver.ChromeService("/opt/chromedriver")
+service = webdriver.ChromeService(os.environ.get("CHROMEDRIVER_PATH", "/opt/chromedriver"))
 
-options.binary_location = '/opt/chrome/chrome'
+options.binary_location = os.environ.get("CHROME_BINARY", "/opt/chrome/chrome")
 options.add_argument("--headless=new")
 options.add_argument('--no-sandbox')
 options.add_argument("--disable-gpu")
@@ -38,6 +59,10 @@ options.add_argument("--remote-debugging-port=9222")
 options.add_argument(f"--user-data-dir={mkdtemp()}")
 options.add_argument(f"--data-path={mkdtemp()}")
 options.add_argument(f"--disk-cache-dir={mkdtemp()}")
+# the mov tabs load in the background, they must not be throttled
+options.add_argument("--disable-background-timer-throttling")
+options.add_argument("--disable-renderer-backgrounding")
+options.add_argument("--disable-backgrounding-occluded-windows")
 
 options.add_experimental_option("excludeSwitches", ["enable-automation"])
 options.add_experimental_option("useAutomationExtension", False)
@@ -51,6 +76,8 @@ options.add_experimental_option(
         "profile.default_content_settings": {"images": 2},
     },
 )
+if LEAN_MODE:
+    lean.apply_options(options)
 
 class ScrapperException(Exception): pass
 
@@ -62,11 +89,8 @@ def get_secret():
     retrieves the secrets associated with the sftp account
     """
 
-    session = boto3.session.Session()
-    client = session.client(service_name='secretsmanager', region_name="eu-central-1")
-
     try:
-        get_secret_value_response = client.get_secret_value(SecretId="BoltPo-Robot")
+        return get_provider("eu-central-1").get("BoltPo-Robot")
     except ClientError as err:
         reply = {
             "function_name": "Scrapper",
@@ -75,8 +99,12 @@ def get_secret():
         }
         raise ScrapperException(reply)
 
-    secret = get_secret_value_response['SecretString']
-    return json.loads(secret)
+
+def prepare_tab(driver):
+    """ the CDP settings are per tab, every new tab needs them before its first page """
+    install_network_hook(driver)
+    if LEAN_MODE:
+        lean.block_resources(driver)
 
 
 def get_driver():
@@ -85,6 +113,7 @@ def get_driver():
             service=service,
             options=options
         )  # no service needed here since we work with selenium image
+        prepare_tab(mydriver)
         logger.info("Headless Chrome initialized")
     except Exception as err:
         logger.critical(f"Chrome initialization error: {str(err)}")
@@ -100,35 +129,59 @@ def get_driver():
 secrets = get_secret()
 WMS_USER = secrets["WMS_USER"]
 WMS_PASS = secrets["WMS_PASS"]
+WMS_API = secrets.get("WMS_API")  # requests and answer mapping of the http engine, see wms_http.py
+session_store = session_cache.get_store()
 
-def handler(event, context):
+def resume_session(driver, waits):
+    """ opens the wms app with the saved session, True when it is still logged in """
+    session = session_cache.load(session_store)
+    if session is None:
+        return False
 
-    # initialize driver and open login page
-    driver = get_driver()
-    driver.get(WMS_URL)    
+    script_id = None
+    try:
+        script_id = session_cache.inject(driver, session)
+        driver.get(WMS_URL)
+        waits.element_present(
+            (By.XPATH, DELIVERY_LINK_XPATH), name="saved session", timeout=SESSION_CHECK_TIME
+        )
+        logger.info("Logged in with the saved session")
+        return True
+    except Exceptions.WebDriverException as err:
+        logger.info(f"Saved session rejected, logging in: {type(err).__name__}")
+        session_cache.discard(driver)
+        session_cache.clear(session_store, rejected=session)
+        return False
+    finally:
+        if script_id is not None:
+            session_cache.remove_script(driver, script_id)
+
+
+def login(driver, waits):
+    """ opens the wms app and logs in, the driver is closed on failure """
+    if resume_session(driver, waits):
+        return
+
+    driver.get(WMS_URL)
     logger.info("Web Site acquired")
-    sleep(5)
 
     # login into the wms app
     try:
-        WebDriverWait(driver, WAIT_TIME).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "input#username"))
+        waits.element_present(
+            (By.CSS_SELECTOR, "input#username"), name="login form"
         ).send_keys(WMS_USER)
 
-        WebDriverWait(driver, WAIT_TIME).until(
-            EC.presence_of_element_located(
-                (
-                    By.XPATH,
-                    '//*[@id="root"]/div/div[1]/div/div[2]/div/form/div[2]/div/input',
-                )
-            )
+        waits.element_present(
+            (
+                By.XPATH,
+                '//*[@id="root"]/div/div[1]/div/div[2]/div/form/div[2]/div/input',
+            ),
+            name="password field",
         ).send_keys(WMS_PASS)
 
-        btn_login = driver.find_element(
-            By.XPATH, '//*[@id="root"]/div/div[1]/div/div[2]/div/form/button'
-        )
+        btn_login = waits.element_clickable((By.XPATH, LOGIN_BUTTON_XPATH), name="login button")
         btn_login.click()
-    except Exceptions.NoSuchElementException:
+    except (Exceptions.NoSuchElementException, Exceptions.TimeoutException):
         logger.critical("Authentication fields problem. Abort")
         driver.quit()
         reply = {
@@ -137,12 +190,13 @@ def handler(event, context):
                 "error_details": None
             }
         raise ScrapperException(reply)
-    sleep(3)
     
     # check if we are still on the login page
-    btn_list = driver.find_elements(
-        By.XPATH, '//*[@id="root"]/div/div[1]/div/div[2]/div/form/button'
-    )
+    try:
+        waits.element_present((By.XPATH, DELIVERY_LINK_XPATH), name="login redirect")
+    except Exceptions.TimeoutException:
+        pass
+    btn_list = driver.find_elements(By.XPATH, LOGIN_BUTTON_XPATH)
     if len(btn_list) > 0:
         logger.info("we are still on the login page. Authentication probably failed.")
         driver.quit()
@@ -155,13 +209,20 @@ def handler(event, context):
     else:
         logger.info("Moved from login page")
 
+    try:
+        session_cache.save(session_store, driver)
+    except Exception as err:
+        # the next run simply logs in again
+        logger.warning(f"Session not saved: {str(err)}")
+
+
+def open_delivery_orders(driver, waits):
+    """ opens the Tomorrow and later tab of the Delivery Orders page """
     # select Delivery Options page
     try:
-        delivery_link = driver.find_element(
-            By.XPATH,
-            '//*[@id="main-content-box"]/div/aside/div[2]/div/div[1]/ul[1]/li[8]/a'
-            )
-        sleep(1)
+        delivery_link = waits.element_clickable(
+            (By.XPATH, DELIVERY_LINK_XPATH), name="delivery orders link"
+        )
         hover = ActionChains(driver).move_to_element(delivery_link)
         hover.click().perform()
         # scroll the link into view and click it
@@ -176,14 +237,14 @@ def handler(event, context):
                 "error_details": None
             }
         raise ScrapperException(reply)
-    sleep(1)
 
     logger.info("Delivery orders selected")
 
     # select Tomorrow and later tab
     try:
-        tabTomorrow_element = driver.find_element(
-            By.XPATH, '//*[@id="main-content-box"]/div/div[2]/div/div[2]/div/div[3]/div'
+        tabTomorrow_element = waits.element_clickable(
+            (By.XPATH, TOMORROW_TAB_XPATH),
+            name="tomorrow tab",
         )
         if tabTomorrow_element.get_attribute("innerHTML") == "Tomorrow and later":
             tabTomorrow_element.click()
@@ -205,84 +266,77 @@ def handler(event, context):
                 "error_details": None
             }
         raise ScrapperException(reply)
-    sleep(1)
+    waits.optional(waits.page_ready, name="tomorrow orders")
     
     logger.info("Tab Tomorrow and later selected")
 
+
+def collect_mov(driver, waits, mov_tabs):
+    """ writes the mov table of every store to the mov_data file
+
+        with mov_tabs > 1 the stores' mov tables are read in that many tabs at once
+    """
     # generate and download the mov data
     mov_data = []
-    store_container = driver.find_element(
-        By.XPATH,
-        '//*[@id="main-content-box"]/div/div/div/div[3]/div/div[1]/div/div/div/div[2]/button',
-    )
+    store_container = waits.element_clickable((By.XPATH, STORE_TOGGLE_XPATH), name="store dropdown")
     store_container.click()
 
-    store_list = driver.find_elements(
-        By.XPATH, '//div[@id="store-select-menu"]/div/div/ul/li'
-    )
-    sleep(1)
+    store_list = waits.list_stable((By.XPATH, STORE_LIST_XPATH), name="store list")
     nr_stores = len(store_list)
 
-    driver.find_element(
-        By.XPATH, '//*[@id="main-content-box"]/div/div[2]/div/div[1]/h3'
-    ).click()
+    driver.find_element(By.XPATH, PAGE_TITLE_XPATH).click()
 
-    for i in range(nr_stores):
-        if i != 0:  # start with default store
-            store_container.click()
-            sleep(1)
-            store_list = driver.find_elements(
-                By.XPATH, '//div[@id="store-select-menu"]/div/div/ul/li'
-            )
-            store_list[i].click()
-            sleep(1)
-            store_list = driver.find_elements(
-                By.XPATH, '//div[@id="store-select-menu"]/div/div/ul/li'
-            )
-            store_list[i - 1].click()
-            sleep(1)
-            driver.find_element(
-                By.XPATH, '//*[@id="main-content-box"]/div/div[2]/div/div[1]/h3'
-            ).click()
-
-        nr_orders = 0
-        row_elements = driver.find_elements(By.XPATH, "//table/tbody/tr")
-        for row in row_elements:
-            col_elements = row.find_elements(By.XPATH, ".//td")
-            supplier = (
-                col_elements[2]
-                .find_element(By.XPATH, ".//a/div/div/span[1]")
-                .get_attribute("innerHTML")
-            )
-            store = (
-                col_elements[6]
-                .find_element(By.XPATH, ".//a/div")
-                .get_attribute("innerHTML")
+    if mov_tabs > 1 and nr_stores > 1:
+        # the default store is read here, the other ones in a pool of tabs
+        try:
+            mov_data += read_mov_table(driver)
+            per_store = read_stores_in_tabs(
+                driver, waits, driver.current_url, range(1, nr_stores), mov_tabs, prepare_tab
             )
-            mov_element = col_elements[7].find_element(By.XPATH, ".//a/div")
-            if mov_element.get_attribute("innerHTML")[0] == "<":
-                mov = mov_element.get_attribute("innerHTML").split(">")[-1]
-                has_order = False
-            else:
-                mov = mov_element.get_attribute("innerHTML")
-                has_order = True
-
-            mov_data.append([supplier, store, has_order, mov])
-            logger.info(f"Store {i} has {nr_orders} elements")
+        except Exception as err:
+            logger.critical(f"MOV tabs error: {str(err)}")
+            driver.quit()
+            reply = {
+                    "function_name": "Scrapper",
+                    "error_message": f"MOV data general error: {str(err)}",
+                    "error_details": None
+                }
+            raise ScrapperException(reply)
+        for i in range(1, nr_stores):
+            mov_data += per_store[i]
+    else:
+        for i in range(nr_stores):
+            if i != 0:  # start with default store
+                store_container.click()
+                store_list = waits.list_stable((By.XPATH, STORE_LIST_XPATH), name="store list")
+                store_list[i].click()
+                store_list = waits.list_stable((By.XPATH, STORE_LIST_XPATH), name="store list")
+                store_list[i - 1].click()
+                waits.optional(waits.list_stable, (By.XPATH, STORE_LIST_XPATH), name="store list")
+                driver.find_element(By.XPATH, PAGE_TITLE_XPATH).click()
+                waits.optional(waits.page_ready, name=f"store {i} orders")
+
+            store_rows = read_mov_table(driver)
+            mov_data += store_rows
+            logger.info(f"Store {i} has {len(store_rows)} elements")
     logger.info("MOV data generated")
 
     # save the mov_data file to file system
-    with open("/tmp/mov_data.csv", "a", newline="") as csv_file:
+    with open(os.path.join(DOWNLOAD_DIR, MOV_FILE), "w", newline="") as csv_file:
         writer = csv.writer(csv_file)
         for line in mov_data:
             writer.writerow(line)
 
     logger.info("MOV file saved")
 
+
+def configure_export(driver, waits):
+    """ opens the report modal and sets up the Bulk PO export, returns the applied form """
     # generate report modal window
     try:
-        btn_Report = driver.find_element(
-            By.XPATH, '//*[@id="main-content-box"]/div/div[2]/div/div[1]/div/button[1]'
+        btn_Report = waits.element_clickable(
+            (By.XPATH, '//*[@id="main-content-box"]/div/div[2]/div/div[1]/div/button[1]'),
+            name="report button",
         )
         btn_Report.click()
     except Exception as err:
@@ -294,7 +348,6 @@ def handler(event, context):
                 "error_details": None
             }
         raise ScrapperException(reply)
-    sleep(1)
 
     """try:
         generate_page = driver.find_element(By.XPATH, "/html/body/div[4]/div[3]/div")
@@ -313,7 +366,7 @@ def handler(event, context):
 
     # select Bulk PO export
     try:
-        rad_elements = driver.find_elements(By.XPATH, '//input[@type="radio"]')
+        rad_elements = waits.list_stable((By.XPATH, '//input[@type="radio"]'), name="report types")
         for element in rad_elements:
             if element.get_attribute("value") == "bulk_po":
                 element.click()
@@ -340,8 +393,7 @@ def handler(event, context):
             if first_line == "CSV":
                 item.click()
                 break
-        sleep(1)
-        driver.find_element(By.XPATH, '//*[text()="XLSX"]').click()
+        waits.element_clickable((By.XPATH, '//*[text()="XLSX"]'), name="xlsx option").click()
     except Exception as err:
         logger.critical(err)
         driver.quit()
@@ -352,246 +404,40 @@ def handler(event, context):
             }
         raise ScrapperException(reply)
 
-    sleep(1)
-
     logger.info("File format selected")
 
-    # Select report fields
+    # configure report fields, locations, stores and suppliers in the page
     try:
-        checkbox_elements = driver.find_elements(By.XPATH, '//input[@type="checkbox"]')
-        for element in checkbox_elements:
-            if element.get_attribute("name") == "Select all" and element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "po_number"
-                and not element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "store_address"
-                and element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "price" and element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "product_name"
-                and not element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "provicer_id"
-                and not element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "plan_qty"
-                and not element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "fact_qty" and element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "supplier_name"
-                and not element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "supplier_id" and element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "edi_store_code"
-                and element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "unit" and not element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "edi_supplier_code"
-                and element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "bolt_sku"
-                and not element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "delivery_date"
-                and not element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "created_date"
-                and element.is_selected()
-            ):
-                element.click()
-            if (
-                element.get_attribute("name") == "supplier_sku"
-                and not element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "total_sum" and element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "store_name"
-                and not element.is_selected()
-            ):
-                element.click()
-            if element.get_attribute("name") == "ean" and not element.is_selected():
-                element.click()
-            if (
-                element.get_attribute("name") == "total_with_vat_sum"
-                and element.is_selected()
-            ):
-                element.click()
+        form = apply_form(driver, FORM_STATE, timeout=WAIT_TIME)
     except Exception as err:
         logger.critical(str(err))
         driver.quit()
         reply = {
                 "function_name": "Scrapper",
-                "error_message": f"general error: {str(err)}",
-                "error_details": None
-            }
-        raise ScrapperException(reply)
-
-    logger.info("Report tags checked")
-
-    # select location
-    try:
-        driver.find_element(By.ID, "city-multi-select-toggle-button").click()
-        sleep(1)
-
-        clj = driver.find_element(By.XPATH, '//*[text()="Cluj-Napoca"]')
-        sleep(1)
-        driver.execute_script("arguments[0].click();", clj)
-
-        buc = driver.find_element(By.XPATH, '//*[text()="Bucharest"]')
-        sleep(1)
-        driver.execute_script("arguments[0].click();", buc)
-
-        # unselect location
-        driver.find_element(By.ID, "city-multi-select-toggle-button").click()
-    except Exception as err:
-        logger.critical(err)
-        driver.quit()
-        reply = {
-                "function_name": "Scrapper",
-                "error_message": f"Location selection general error: {str(err)}",
-                "error_details": None
-            }
-        raise ScrapperException(reply)
-    logger.info("Location selected")
-    
-    # scroll down the page to get visibility
-    actions = ActionChains(driver)
-    actions.send_keys(Keys.PAGE_DOWN).perform()
-    
-    # select store
-    try:
-        btn_store = driver.find_element(
-            By.XPATH, 
-            '//*[@id="storeSelectBox"]/div/div/div/div[2]/button'
-        )
-        driver.execute_script("arguments[0].scrollIntoView(true);", btn_store)
-        btn_store.click()
-        sleep(1)
-
-        store_list = driver.find_elements(
-            By.XPATH, '//div[@id="store-select-menu"]/div/div/ul/li'
-        )
-        logger.info(f"Found {len(store_list)} stores")
-        for store in store_list:
-            driver.execute_script("arguments[0].click();", store)
-        
-        # unselect store
-        btn_store = driver.find_element(
-            By.XPATH, 
-            '//*[@id="storeSelectBox"]/div/div/div/div[2]/button'
-            )
-        driver.execute_script("arguments[0].click();", btn_store)
-    except Exception as err:
-        logger.critical(err)
-        driver.quit()
-        reply = {
-                "function_name": "Scrapper",
-                "error_message": f"Store selection general error: {str(err)}",
-                "error_details": None
-            }
-        raise ScrapperException(reply)
-    logger.info("Stores selected")
-
-    # select suppliers
-    try:
-        btn_supplier = driver.find_element(
-            By.XPATH, 
-            '//*[@id="supplierSelectBox"]/div/div/div/div/div[2]/button'
-        )
-        driver.execute_script("arguments[0].click();", btn_supplier)
-        sleep(1)
-
-        supp_modal = driver.find_element(
-            By.XPATH, '//div[@data-overlay-container="true"]/div/div'
-        )
-    except Exception as err:
-        logger.critical(err)
-        driver.quit()
-        reply = {
-                "function_name": "Scrapper",
-                "error_message": f"Supplier selection general error: {str(err)}",
+                "error_message": f"Export form configuration error: {str(err)}",
                 "error_details": None
             }
         raise ScrapperException(reply)
 
-    try:
-        selected_items = ["All"]
-        is_over = False
-
-        nr_suppliers = 0
-        while not is_over:
-            is_over = True
-
-            # read the visible portion of the list
-            supplier_list = driver.find_elements(
-                By.XPATH, '//div[@id="supplier-select-menu"]/div/div/ul/li'
-            )
-            sleep(1)
-
-            if len(supplier_list) == 0:
-                break
-            else:
-                nr_suppliers += len(supplier_list)
-
-            # if there are suppliers not selected yet, select and add them to the list
-            for item in supplier_list:
-                if item.text not in selected_items:
-                    item.click()
-                    selected_items.append(item.text)
-                    is_over = False
-
-            # scroll down to see if there are more suppliers in the list
-            driver.execute_script(
-                "arguments[0].scrollTop = arguments[0].scrollTop + arguments[0].offsetHeight;",
-                supp_modal,
-            )
-            sleep(1)
-        logger.info(f"There are {nr_suppliers} suppliers in the list")
-
-        # click again the button to get rid of the floating list
-        btn_supplier = driver.find_element(
-            By.XPATH, 
-            '//div[@id="supplier-select-menu"]/div/div/ul/li'
-            )
-        driver.execute_script("arguments[0].click();", btn_supplier)
-    except Exception as err:
-        logger.critical(str(err))
+    problems = check_form(FORM_STATE, form)
+    if len(problems) > 0:
+        logger.critical(f"Export form not configured as requested: {problems}")
         driver.quit()
         reply = {
                 "function_name": "Scrapper",
-                "error_message": f"Supplier selection general error: {str(err)}",
-                "error_details": None
+                "error_message": "Export form not configured as requested",
+                "error_details": problems
             }
         raise ScrapperException(reply)
-    logger.info("Suppliers selected")
+    if len(missing_fields(FORM_STATE, form)) > 0:
+        logger.warning(f"Report fields not shown by the export form: {missing_fields(FORM_STATE, form)}")
+    if len(unverified(form)) > 0:
+        logger.warning(f"Selection not shown by the page, the clicks are trusted: {unverified(form)}")
+    counts = form_counts(form)
+    logger.info(
+        f"Export form configured: {counts['cities']} cities, "
+        f"{counts['stores']} stores, {counts['suppliers']} suppliers"
+    )
 
     # set the date of the report  ---- not developed yet
     """try:
@@ -627,7 +473,13 @@ def handler(event, context):
 
     logger.info("Current date verified")"""
 
+    return form
+
+
+def download_export(driver, waits):
+    """ proceeds with the export and waits for the verified Bulk PO archive """
     # check download as zip box and click the Proceed button
+    watcher = DownloadWatcher(DOWNLOAD_DIR)
     try:
         driver.find_element(
             By.XPATH,
@@ -639,6 +491,7 @@ def handler(event, context):
         ).click()
     except Exception as err:
         logger.critical(err)
+        watcher.close()
         driver.quit()
         reply = {
                 "function_name": "Scrapper",
@@ -648,26 +501,38 @@ def handler(event, context):
         raise ScrapperException(reply)
     logger.info("Generated the report")
 
-    # wait until download complete
-    nr_attempts = 10
-    is_downloaded = False
-    for i in range(nr_attempts):
-        if os.path.exists("/tmp/Bulk PO.zip"):
-            is_downloaded = True
-            break
-        else:
-            sleep(3)
-
-    if not is_downloaded:
-        logger.critical("Timeout exceeded. Bulk PO file download failed")
+    # wait until the download is complete and the archive is sound
+    try:
+        download = watcher.wait(BULK_PO_FILE, timeout=DOWNLOAD_TIME)
+    except DownloadException as err:
+        logger.critical(f"Bulk PO file download failed: {str(err)}")
         driver.quit()
         reply = {
                 "function_name": "Scrapper",
-                "error_message": "Bulk PO download timeout exceeded.",
+                "error_message": f"Bulk PO download failed: {str(err)}",
                 "error_details": None
             }
         raise ScrapperException(reply)
+    finally:
+        watcher.close()
     logger.info("File downloaded")
+    return download
+
+
+def drain_traffic(driver, traffic):
+    """ empties the lean mode performance log, chrome would keep it for the whole run """
+    if traffic is None:
+        return
+    try:
+        traffic.drain(driver)
+    except Exception as err:
+        logger.warning(f"Traffic report not available: {str(err)}")
+
+
+def close_browser(driver, waits, traffic=None):
+    if traffic is not None:
+        drain_traffic(driver, traffic)
+        logger.info(f"Traffic: {traffic.report}")
 
     # cancel and quit
     try:
@@ -679,38 +544,286 @@ def handler(event, context):
         pass
     finally:
         driver.quit()
-    
-    # save output files to s3
-    s3_client = boto3.client("s3")
+    logger.info(f"Waits: {waits.summary()}")
+
+
+def run_browser(mov_tabs=MOV_TABS, run=None, jobs=JOBS, tracer=None):
+    """ drives headless Chrome through the Delivery Orders page and writes the files of the jobs
+
+        the phases already done in run are restored instead of scraped again
+    """
+    if run is None:
+        run = RunState()
+    if tracer is None:
+        tracer = Tracer()
+    with tracer.span("chrome startup"):
+        driver = get_driver()
     try:
-        s3_client.upload_file(
-            "/tmp/Bulk PO.zip", 
-            "bolt-projects", 
-            "purchasing-orders/input/Bulk PO.zip")
-    except Exception as err:
+        tracer.attach(driver)
+        waits = Waits(driver, timeout=WAIT_TIME)
+        traffic = lean.Traffic() if LEAN_MODE else None
+
+        run.start("login")
+        with tracer.span("login"):
+            login(driver, waits)
+        drain_traffic(driver, traffic)
+        run.complete("login")
+
+        with tracer.span("delivery orders"):
+            open_delivery_orders(driver, waits)
+        drain_traffic(driver, traffic)
+
+        if "mov" not in jobs:
+            pass
+        elif run.is_done("mov"):
+            run.restore("mov", DOWNLOAD_DIR)
+        else:
+            run.start("mov")
+            with tracer.span("mov", tabs=mov_tabs):
+                collect_mov(driver, waits, mov_tabs)
+            drain_traffic(driver, traffic)
+            run.complete("mov", DOWNLOAD_DIR, files=[MOV_FILE])
+
+        if "export" not in jobs:
+            pass
+        elif run.is_done("download"):
+            run.restore("download", DOWNLOAD_DIR)
+        else:
+            run.start("export_config")
+            with tracer.span("export_config"):
+                form = configure_export(driver, waits)
+            drain_traffic(driver, traffic)
+            run.complete(
+                "export_config",
+                outputs=form_counts(form),
+            )
+
+            run.start("download")
+            with tracer.span("download"):
+                download = download_export(driver, waits)
+            run.complete(
+                "download", DOWNLOAD_DIR, files=[BULK_PO_FILE], outputs={"size": download["size"]}
+            )
+
+        tracer.detach()
+        with tracer.span("close"):
+            close_browser(driver, waits, traffic)
+    finally:
+        # the phases quit the driver when they abort, on any other error chrome would
+        # keep its debugging port and profile and the next run of the container fails
+        tracer.detach()
+        driver.quit()
+
+
+def run_client(jobs=JOBS):
+    """ calls the wms endpoints directly, borrowing a browser session when no login endpoint is set """
+    client = WmsClient(WMS_URL, WMS_API)
+
+    def run_jobs(**credentials):
+        run_http(client, DOWNLOAD_DIR, jobs=jobs, **credentials)
+        if "export" in jobs:
+            verify_zip(os.path.join(DOWNLOAD_DIR, BULK_PO_FILE))
+
+    if "login" in WMS_API:
+        run_jobs(user=WMS_USER, password=WMS_PASS)
+        return
+
+    session = session_cache.load(session_store)
+    if session is not None:
+        try:
+            run_jobs(cookies=session["cookies"])
+            return
+        except WmsHttpException as err:
+            logger.info(f"Saved session not accepted by the http engine: {str(err)}")
+
+    driver = get_driver()
+    try:
+        login(driver, Waits(driver, timeout=WAIT_TIME))
+        cookies = driver.get_cookies()
+    finally:
+        driver.quit()
+    run_jobs(cookies=cookies)
+
+
+def upload_outputs(jobs=JOBS):
+    # save output files of the jobs to s3
+    s3_client = boto3.client("s3")
+    for job in jobs:
+        try:
+            s3_client.upload_file(
+                os.path.join(DOWNLOAD_DIR, JOB_FILES[job]),
+                "bolt-projects", 
+                f"purchasing-orders/input/{JOB_FILES[job]}")
+        except Exception as err:
+            reply = {
+                    "function_name": "Scrapper",
+                    "error_message": f"{JOB_FILES[job]} transfer to s3 error: {str(err)}",
+                    "error_details": None
+                }
+            raise ScrapperException(reply)
+
+
+def scrape(event, engine, run, jobs, tracer):
+    """ produces the files of the jobs, returns the engine that did it
+
+        files of the phases done by an earlier attempt of the run are restored
+    """
+    phases = [JOB_PHASES[job] for job in jobs]
+    if all(run.is_done(phase) for phase in phases):
+        for phase in phases:
+            run.restore(phase, DOWNLOAD_DIR)
+        return "checkpoint"
+
+    if engine == "http" or (engine == "auto" and WMS_API):
+        if not WMS_API:
+            reply = {
+                    "function_name": "Scrapper",
+                    "error_message": "WMS_API configuration missing from the secret",
+                    "error_details": None
+                }
+            raise ScrapperException(reply)
+        try:
+            # the http engine gets the files of all the jobs in one go
+            for job in jobs:
+                run.start(JOB_PHASES[job])
+            with tracer.span("http engine", jobs=jobs):
+                run_client(jobs)
+            for job in jobs:
+                run.complete(JOB_PHASES[job], DOWNLOAD_DIR, files=[JOB_FILES[job]])
+            return "http"
+        except (WmsHttpException, DownloadException) as err:
+            if engine == "http":
+                reply = {
+                        "function_name": "Scrapper",
+                        "error_message": f"HTTP engine error: {str(err)}",
+                        "error_details": None
+                    }
+                raise ScrapperException(reply)
+            logger.warning(f"HTTP engine failed, falling back to the browser: {str(err)}")
+            # a partial or unsound file of the http engine would be taken for the browser's
+            clear_stale(*[os.path.join(DOWNLOAD_DIR, JOB_FILES[job]) for job in jobs])
+
+    run_browser(int(event.get("mov_tabs", MOV_TABS)), run, jobs, tracer)
+    return "selenium"
+
+
+def handler(event, context):
+    """ event["engine"] picks the scraper: "http", "selenium" or "auto" (http, then selenium on failure)
+
+        event["run_id"] continues that run: the phases it completed are not done again
+
+        event["jobs"] picks the files to produce, ["mov"], ["export"] or both (default).
+        the two jobs can run in parallel invocations, each one uploads its own file
+    """
+    event = event or {}
+    engine = event.get("engine", ENGINE)
+    if engine not in ENGINES:
         reply = {
                 "function_name": "Scrapper",
-                "error_message": f"Bulk PO transfer to s3 error: {str(err)}",
+                "error_message": f"Unknown engine: {engine}",
                 "error_details": None
             }
         raise ScrapperException(reply)
-    
-    try:
-        s3_client.upload_file(
-            "/tmp/mov_data.csv", 
-            "bolt-projects", 
-            "purchasing-orders/input/mov_data.csv")
-    except Exception as err:
+
+    run = RunState(event.get("run_id"), boto3.client("s3"))
+    # a resumed run keeps the jobs it was started with
+    jobs = event.get("jobs") or run.state.get("jobs") or JOBS
+    if isinstance(jobs, str):
+        jobs = [jobs]
+    unknown = [job for job in jobs if job not in JOBS]
+    if len(unknown) > 0:
         reply = {
                 "function_name": "Scrapper",
-                "error_message": f"mov_data transfer to s3 error: {str(err)}",
+                "error_message": f"Unknown jobs: {unknown}",
                 "error_details": None
             }
         raise ScrapperException(reply)
-    logger.info("procedure finalized and stopped successfully")
+    jobs = [job for job in JOBS if job in jobs]
+    run.set_jobs(jobs)
+
+    if run.is_done("upload"):
+        logger.info(f"Run {run.run_id} already completed")
+        return {
+            "function_name": "Scrapper",
+            "error_message": None,
+            "error_details": None,
+            "engine": None,
+            "jobs": jobs,
+            "run_id": run.run_id,
+            "phases": run.summary(),
+        }
+
+    # a warm container still holds the files of the previous run
+    clear_stale(*[os.path.join(DOWNLOAD_DIR, JOB_FILES[job]) for job in jobs])
+
+    tracer = Tracer(run.run_id)
+    steps = StepHandler(tracer)
+    logger.addHandler(steps)
+    try:
+        used = scrape(event, engine, run, jobs, tracer)
+
+        run.start("upload")
+        with tracer.span("upload"):
+            upload_outputs(jobs)
+        run.complete("upload")
+    except Exception as err:
+        if isinstance(err, ScrapperException):
+            err.args[0]["run_id"] = run.run_id
+        try:
+            run.fail(str(err))
+        except Exception as state_err:
+            logger.error(f"Run state not saved: {str(state_err)}")
+        raise
+    finally:
+        logger.removeHandler(steps)
+        if event.get("trace", TRACING):
+            try:
+                tracer.save(run.s3)
+            except Exception as trace_err:
+                # the trace is a diagnostic, it never fails the run
+                logger.error(f"Trace not saved: {str(trace_err)}")
+    run.finish()
+    logger.info(f"procedure finalized and stopped successfully, engine {used}, jobs {jobs}, run {run.run_id}")
 
     return {
         "function_name": "Scrapper",
         "error_message": None,
         "error_details": None,
-    }
\ No newline at end of file
+        "engine": used,
+        "jobs": jobs,
+        "run_id": run.run_id,
+        "phases": run.summary(),
+    }
+
+
+def resume(event, context):
+    """ continues a failed run
+
+        event["run_id"] defaults to the last started run of event["jobs"] (both by
+        default). the jobs must share that run, when they were last run separately
+        the run_id, or a single job, is needed
+    """
+    event = dict(event or {})
+    if not event.get("run_id"):
+        jobs = event.get("jobs") or JOBS
+        if isinstance(jobs, str):
+            jobs = [jobs]
+        s3 = boto3.client("s3")
+        latest = {job: latest_run_id(s3, job) for job in jobs if job in JOBS}
+        run_ids = set(run_id for run_id in latest.values() if run_id is not None)
+        if len(run_ids) > 1:
+            reply = {
+                    "function_name": "Scrapper",
+                    "error_message": "The jobs were last run separately, give the run_id or a single job",
+                    "error_details": latest
+                }
+            raise ScrapperException(reply)
+        event["run_id"] = run_ids.pop() if len(run_ids) == 1 else None
+    if event["run_id"] is None:
+        reply = {
+                "function_name": "Scrapper",
+                "error_message": "No run to resume",
+                "error_details": None
+            }
+        raise ScrapperException(reply)
+    return handler(event, context)
@@ -0,0 +1,163 @@
+""" MOV (minimum order value) collection from the Delivery Orders table
+
+    with a pool of tabs the stores are read concurrently: every tab opens the
+    Delivery Orders page, selects its store in the page and loads its table while
+    the driver waits on the oldest tab, so the run takes about as long as the
+    slowest stores instead of the sum of all of them
+"""
+
+import logging
+
+from collections import deque
+from export_form import STORE_LIST_XPATH
+
+logger = logging.getLogger(__name__)
+
+TOMORROW_TAB_XPATH = '//*[@id="main-content-box"]/div/div[2]/div/div[2]/div/div[3]/div'
+STORE_TOGGLE_XPATH = '//*[@id="main-content-box"]/div/div/div/div[3]/div/div[1]/div/div/div/div[2]/button'
+PAGE_TITLE_XPATH = '//*[@id="main-content-box"]/div/div[2]/div/div[1]/h3'
+SELECT_TIME = 10  # in seconds, max time for a tab to select its store
+
+# switches a freshly opened Delivery Orders page from the default store to
+# store number index, without waiting: the outcome is left in window.__boltStore
+SELECT_STORE_SCRIPT = """
+const [tabXPath, toggleXPath, itemsXPath, titleXPath, index, timeoutMs] = arguments;
+window.__boltStore = {done: false, error: null, store: null};
+const find = xpath => document.evaluate(
+    xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+const findAll = xpath => {
+    const found = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({length: found.snapshotLength}, (_, i) => found.snapshotItem(i));
+};
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+const waitFor = async (name, lookup) => {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        const found = lookup();
+        if (found) { return found; }
+        await sleep(50);
+    }
+    throw new Error(`${name} not shown`);
+};
+const storeItems = () => {
+    const items = findAll(itemsXPath);
+    return items.length > index ? items : null;
+};
+
+(async () => {
+    const tab = await waitFor("tomorrow tab", () => {
+        const element = find(tabXPath);
+        return element && element.innerHTML === "Tomorrow and later" ? element : null;
+    });
+    tab.click();
+    (await waitFor("store dropdown", () => find(toggleXPath))).click();
+    let items = await waitFor("store list", storeItems);
+    const store = items[index].textContent.trim();
+    items[index].click();
+    items = await waitFor("store list", storeItems);
+    items[0].click();
+    find(titleXPath).click();
+    window.__boltStore = {done: true, error: null, store: store};
+})().catch(err => { window.__boltStore = {done: true, error: String(err), store: null}; });
+"""
+
+STORE_STATE_SCRIPT = """
+return window.__boltStore && window.__boltStore.done ? window.__boltStore : null;
+"""
+
+# reads the whole orders table of the selected store in one WebDriver round trip,
+# the selectors mirror the xpaths //table/tbody/tr and, per row, .//a/div/div/span[1]
+# (supplier), .//a/div (store) and .//a/div (mov) of the columns 2, 6 and 7
+MOV_TABLE_SCRIPT = """
+const html = (cell, selector) => {
+    const element = cell ? cell.querySelector(selector) : null;
+    return element ? element.innerHTML : null;
+};
+return Array.from(document.querySelectorAll("table > tbody > tr")).map(row => {
+    const cells = row.querySelectorAll("td");
+    return {
+        supplier: html(cells[2], "a > div > div > span"),
+        store: html(cells[6], "a > div"),
+        mov: html(cells[7], "a > div"),
+    };
+});
+"""
+
+
+def parse_mov(mov_html):
+    """ a mov cell starting with markup (the warning icon) means the order does not reach the MOV """
+    if mov_html is None:
+        return "", False
+    if mov_html.startswith("<"):
+        return mov_html.split(">")[-1], False
+    return mov_html, True
+
+
+def read_mov_table(driver):
+    """ returns the [supplier, store, has_order, mov] rows of the table on screen """
+    rows = driver.execute_script(MOV_TABLE_SCRIPT) or []
+
+    mov_data = []
+    for row in rows:
+        mov, has_order = parse_mov(row["mov"])
+        mov_data.append([row["supplier"], row["store"], has_order, mov])
+    return mov_data
+
+
+def _open_store_tab(driver, url, index, prepare_tab):
+    driver.switch_to.new_window("tab")
+    if prepare_tab is not None:
+        prepare_tab(driver)
+    driver.get(url)
+    driver.execute_script(
+        SELECT_STORE_SCRIPT,
+        TOMORROW_TAB_XPATH,
+        STORE_TOGGLE_XPATH,
+        STORE_LIST_XPATH,
+        PAGE_TITLE_XPATH,
+        index,
+        SELECT_TIME * 1000,
+    )
+    return driver.current_window_handle
+
+
+def read_stores_in_tabs(driver, waits, url, indexes, pool_size, prepare_tab=None):
+    """ reads the mov table of every store index with up to pool_size tabs open at once
+
+        prepare_tab(driver) is called in every new tab before it loads url. returns
+        {index: rows}, the driver is switched back to the tab it started from
+    """
+    home = driver.current_window_handle
+    pending = deque(indexes)
+    open_tabs = deque()
+    results = {}
+
+    try:
+        while pending or open_tabs:
+            # keep the pool full, the tabs load in the background
+            while pending and len(open_tabs) < pool_size:
+                index = pending.popleft()
+                open_tabs.append((index, _open_store_tab(driver, url, index, prepare_tab)))
+
+            index, handle = open_tabs.popleft()
+            driver.switch_to.window(handle)
+            state = waits.until(
+                f"store {index} selected", lambda d: d.execute_script(STORE_STATE_SCRIPT), timeout=SELECT_TIME
+            )
+            if state["error"] is not None:
+                raise RuntimeError(f"Store {index} not selected: {state['error']}")
+            waits.optional(waits.page_ready, name=f"store {index} orders")
+
+            results[index] = read_mov_table(driver)
+            logger.info(f"Store {index} ({state['store']}) has {len(results[index])} elements")
+            driver.close()
+            # no command, not even opening a tab, is accepted from a closed tab
+            driver.switch_to.window(home)
+    finally:
+        for _, handle in open_tabs:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(home)
+
+    return results
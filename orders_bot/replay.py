@@ -0,0 +1,230 @@
+""" offline record / replay harness for benchmarking the browser scraper
+
+    record: a local proxy forwards the scraper's traffic to the live WMS and saves
+    every response to the fixtures folder (needs the WMS credentials)
+
+        python replay.py record --fixtures fixtures
+
+    replay: a local server answers the scraper from the fixtures, no network
+    access nor credentials are needed
+
+        python replay.py replay --fixtures fixtures --runs 3 --mov-tabs 4
+
+    run from the orders_bot folder with PYTHONPATH=../shared/python for the shared
+    modules. both run main.run_browser against the local server on a local Chrome,
+    set CHROME_BINARY and CHROMEDRIVER_PATH when they are not in /opt. every run
+    prints the wall time, the time of every step (between two scraper log lines,
+    the steps of the run trace) and the WebDriver commands it sent
+
+    only the traffic of the WMS origin goes through the proxy, requests the app
+    sends to other hosts are neither recorded nor served
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from tracing import StepHandler, Tracer
+
+logger = logging.getLogger(__name__)
+
+LIVE_URL = "https://wms.bolt.eu"
+INDEX_FILE = "index.json"
+# query parameters the app fills with timestamps or random values
+IGNORED_PARAMS = {"_", "t", "ts", "timestamp", "nocache"}
+# headers that belong to one connection, or that no longer match the saved body
+SKIPPED_HEADERS = {
+    "connection", "keep-alive", "transfer-encoding", "content-encoding", "content-length",
+    "strict-transport-security", "alt-svc",
+}
+REPLAY_SECRET = {"WMS_USER": "replay", "WMS_PASS": "replay"}
+
+
+def fixture_key(method, path):
+    """ METHOD /path?sorted&query, without the volatile parameters """
+    url = urlsplit(path)
+    query = sorted((name, value) for name, value in parse_qsl(url.query) if name not in IGNORED_PARAMS)
+    return f"{method} {url.path}" + (f"?{urlencode(query)}" if query else "")
+
+
+def local_cookie(header):
+    """ a Set-Cookie of the live site, usable on http://127.0.0.1 """
+    parts = [part.strip() for part in header.split(";")]
+    kept = [
+        part for part in parts
+        if part.split("=")[0].lower() not in ("domain", "secure", "samesite")
+    ]
+    return "; ".join(kept)
+
+
+class Fixtures:
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.index = {}
+        self.misses = []
+        path = os.path.join(folder, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.index = json.load(file)
+
+    def save(self, key, status, headers, body):
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        with self.lock:
+            os.makedirs(os.path.join(self.folder, "bodies"), exist_ok=True)
+            with open(os.path.join(self.folder, "bodies", name), "wb") as file:
+                file.write(body)
+            self.index[key] = {"status": status, "headers": headers, "body": name}
+            with open(os.path.join(self.folder, INDEX_FILE), "w", encoding="utf-8") as file:
+                json.dump(self.index, file, indent=2)
+
+    def load(self, key):
+        entry = self.index.get(key)
+        if entry is None:
+            with self.lock:
+                self.misses.append(key)
+            return None
+        with open(os.path.join(self.folder, "bodies", entry["body"]), "rb") as file:
+            return entry["status"], entry["headers"], file.read()
+
+
+def make_handler(fixtures, target=None):
+    """ replays the fixtures, or records them from target when it is set """
+    session = None
+    if target is not None:
+        import requests
+        session = requests.Session()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _answer(self, status, headers, body):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _forward(self, key):
+            length = int(self.headers.get("Content-Length", 0))
+            request_headers = {
+                name: value for name, value in self.headers.items()
+                if name.lower() not in ("host", "accept-encoding", "content-length", "connection")
+            }
+            response = session.request(
+                self.command,
+                target + self.path,
+                headers=request_headers,
+                data=self.rfile.read(length) if length else None,
+                allow_redirects=False,
+            )
+            headers = []
+            for name, value in response.raw.headers.items():
+                if name.lower() in SKIPPED_HEADERS:
+                    continue
+                if name.lower() == "set-cookie":
+                    value = local_cookie(value)
+                if name.lower() == "location":
+                    value = value.replace(target, "")
+                headers.append([name, value])
+            fixtures.save(key, response.status_code, headers, response.content)
+            return response.status_code, headers, response.content
+
+        def _serve(self):
+            key = fixture_key(self.command, self.path)
+            if session is not None:
+                answer = self._forward(key)
+            else:
+                if self.headers.get("Content-Length"):
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                answer = fixtures.load(key)
+                if answer is None:
+                    logger.warning(f"no fixture for {key}")
+                    answer = (404, [["Content-Type", "text/plain"]], b"no fixture")
+            self._answer(*answer)
+
+        do_GET = _serve
+        do_POST = _serve
+        do_PUT = _serve
+        do_PATCH = _serve
+        do_DELETE = _serve
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def benchmark(main, mov_tabs):
+    """ one run_browser against the configured WMS_URL, returns its measures """
+    # the files of an earlier run would be taken for this run's downloads
+    main.clear_stale(*[os.path.join(main.DOWNLOAD_DIR, name) for name in main.JOB_FILES.values()])
+
+    # the steps are the ones of the run trace
+    tracer = Tracer()
+    steps = StepHandler(tracer)
+    main.logger.addHandler(steps)
+    error = None
+    try:
+        main.run_browser(mov_tabs, tracer=tracer)
+    except main.ScrapperException as err:
+        error = err.args[0]
+    finally:
+        main.logger.removeHandler(steps)
+
+    return {
+        "wall_seconds": round(time.perf_counter() - tracer.origin, 3),
+        "error": error,
+        "steps": [
+            {"step": event["name"], "seconds": round(event["dur"] / 1_000_000, 3), **event["args"]}
+            for event in tracer.events if event.get("cat") == "step"
+        ],
+        "webdriver_commands": tracer.counter.total(),
+        "commands": tracer.counter.commands,
+    }
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="record or replay the WMS pages for the scraper")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--fixtures", default="fixtures")
+    parser.add_argument("--target", default=LIVE_URL, help="live WMS url, record mode only")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--mov-tabs", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fixtures = Fixtures(args.fixtures)
+    target = args.target.rstrip("/") if args.mode == "record" else None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fixtures, target))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # main reads its settings when imported
+    os.environ["WMS_URL"] = f"http://127.0.0.1:{server.server_port}"
+    # the saved session must not leak into the fixtures nor come from a real run
+    os.environ["BOLT_SESSION_FILE"] = os.path.join(tempfile.mkdtemp(), "session.json")
+    if args.mode == "replay":
+        os.environ.setdefault("BOLT_SECRET_BOLTPO_ROBOT", json.dumps(REPLAY_SECRET))
+    import main
+
+    reports = []
+    for run in range(args.runs):
+        reports.append(benchmark(main, args.mov_tabs))
+        logger.info(f"run {run + 1}: {reports[-1]['wall_seconds']} s, {reports[-1]['webdriver_commands']} commands")
+    server.shutdown()
+
+    print(json.dumps({"mode": args.mode, "runs": reports, "missing_fixtures": sorted(set(fixtures.misses))}, indent=4))
+    return 0 if all(report["error"] is None for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,175 @@
+""" reuse of the authenticated WMS session across scraper runs
+
+    after a successful login the cookies and the local storage of the wms app are
+    saved to the BoltPo-Robot-Session secret (encrypted at rest by Secrets Manager):
+
+    {
+        "saved_at": 1715932800.0,
+        "expires_at": 1715961600.0,
+        "origin": "https://wms.bolt.eu",
+        "cookies": [{"name": ..., "value": ..., "domain": ..., "path": ..., "expiry": ...}],
+        "local_storage": {"key": "value"}
+    }
+
+    the next run injects them through CDP before the first driver.get and only
+    types the credentials when the saved session is missing, expired or rejected
+
+    for local runs the session is kept in the json file named by BOLT_SESSION_FILE
+"""
+
+import json
+import logging
+import os
+import time
+import boto3
+
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+SESSION_SECRET_ID = os.environ.get("BOLT_SESSION_SECRET", "BoltPo-Robot-Session")
+SESSION_TTL = int(os.environ.get("BOLT_SESSION_TTL", 8 * 3600))  # in seconds
+REGION = "eu-central-1"
+
+# fills the saved local storage of the wms origin before the app scripts run
+LOCAL_STORAGE_SCRIPT = """
+(() => {
+    if (window.location.origin !== %s) { return; }
+    const items = %s;
+    for (const [key, value] of Object.entries(items)) {
+        if (window.localStorage.getItem(key) === null) { window.localStorage.setItem(key, value); }
+    }
+})();
+"""
+
+
+class SecretsStore:
+    def __init__(self, secret_id=SESSION_SECRET_ID, region_name=REGION):
+        self.secret_id = secret_id
+        self.client = boto3.client("secretsmanager", region_name=region_name)
+
+    def read(self):
+        try:
+            value = self.client.get_secret_value(SecretId=self.secret_id)["SecretString"]
+        except self.client.exceptions.ResourceNotFoundException:
+            return None
+        return json.loads(value)
+
+    def write(self, session):
+        self.client.put_secret_value(SecretId=self.secret_id, SecretString=json.dumps(session))
+
+
+class FileStore:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def write(self, session):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(session, file)
+
+
+def get_store():
+    path = os.environ.get("BOLT_SESSION_FILE")
+    if path:
+        return FileStore(path)
+    return SecretsStore()
+
+
+def load(store, now=None):
+    """ returns the saved session, or None when there is none or it expired """
+    if now is None:
+        now = time.time()
+    try:
+        session = store.read()
+    except Exception as err:
+        logger.warning(f"Saved session not readable: {str(err)}")
+        return None
+    if not session or not session.get("cookies"):
+        return None
+    if session.get("expires_at", 0) <= now:
+        logger.info("Saved session expired")
+        return None
+    return session
+
+
+def save(store, driver, ttl=SESSION_TTL, now=None):
+    """ saves the cookies and local storage of the logged in driver
+
+        the session expires after ttl seconds or with its first expiring cookie
+    """
+    if now is None:
+        now = time.time()
+    cookies = driver.get_cookies()
+    expiries = [cookie["expiry"] for cookie in cookies if cookie.get("expiry")]
+    session = {
+        "saved_at": now,
+        "expires_at": min([now + ttl] + expiries),
+        "origin": driver.execute_script("return window.location.origin;"),
+        "cookies": cookies,
+        "local_storage": driver.execute_script("return Object.assign({}, window.localStorage);"),
+    }
+    store.write(session)
+    logger.info(f"Session saved, valid for {int(session['expires_at'] - now)} s")
+
+
+def clear(store, rejected=None):
+    """ forgets the saved session, only if it is still the rejected one when given
+
+        a parallel invocation may have saved a fresh session in the meantime
+    """
+    if rejected is not None:
+        try:
+            current = store.read()
+        except Exception as err:
+            logger.warning(f"Saved session not readable: {str(err)}")
+            return
+        if not current or current.get("saved_at") != rejected.get("saved_at"):
+            return
+    store.write({})
+
+
+def _cdp_cookie(cookie):
+    """ selenium cookie dict -> CDP Network.CookieParam """
+    param = {
+        "name": cookie["name"],
+        "value": cookie["value"],
+        "domain": cookie["domain"],
+        "path": cookie.get("path", "/"),
+        "secure": cookie.get("secure", False),
+        "httpOnly": cookie.get("httpOnly", False),
+    }
+    if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+        param["sameSite"] = cookie["sameSite"]
+    if cookie.get("expiry"):
+        param["expires"] = cookie["expiry"]
+    return param
+
+
+def inject(driver, session):
+    """ sets the saved cookies and local storage before the first page load
+
+        returns the identifier of the local storage script, to pass to remove_script
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd(
+        "Network.setCookies", {"cookies": [_cdp_cookie(cookie) for cookie in session["cookies"]]}
+    )
+    source = LOCAL_STORAGE_SCRIPT % (json.dumps(session["origin"]), json.dumps(session.get("local_storage", {})))
+    return driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})["identifier"]
+
+
+def remove_script(driver, identifier):
+    driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier})
+
+
+def discard(driver):
+    """ drops a rejected session from the browser before the full login """
+    driver.delete_all_cookies()
+    driver.execute_script("window.localStorage.clear();")
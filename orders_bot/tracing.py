@@ -0,0 +1,196 @@
+""" step-level performance trace of a scraper run, in the chrome://tracing format
+
+    every span records its wall time and the WebDriver commands sent within it.
+    spans opened with a driver attached also record the CDP Performance.getMetrics
+    deltas and the navigation timing of the current page. each info log line of
+    the scraper closes a "step" span, so the log messages show up on the chart
+
+    the trace is written next to the run checkpoints:
+
+    purchasing-orders/runs/{run_id}/trace-20240517T060000.json
+"""
+
+import json
+import logging
+import time
+
+from checkpoints import BUCKET, RUNS_PREFIX
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+# absolute values are reported as they are at the span end, the other ones as deltas
+ABSOLUTE_METRICS = ["JSHeapUsedSize", "JSHeapTotalSize", "Nodes", "Documents", "Frames"]
+DELTA_METRICS = ["LayoutCount", "RecalcStyleCount", "LayoutDuration", "RecalcStyleDuration", "ScriptDuration", "TaskDuration"]
+
+NAVIGATION_TIMING_SCRIPT = """
+const nav = performance.getEntriesByType("navigation")[0];
+if (!nav) { return null; }
+return {
+    url: nav.name,
+    dom_content_loaded_ms: Math.round(nav.domContentLoadedEventEnd),
+    load_ms: Math.round(nav.loadEventEnd),
+    transfer_bytes: nav.transferSize,
+};
+"""
+
+
+class CommandCounter:
+    """ counts the WebDriver commands a driver sends """
+
+    def __init__(self):
+        self.commands = {}
+        self.paused = False
+
+    def attach(self, driver):
+        execute = driver.execute
+
+        def counted(driver_command, params=None):
+            if not self.paused:
+                self.commands[driver_command] = self.commands.get(driver_command, 0) + 1
+            return execute(driver_command, params)
+
+        driver.execute = counted
+        return driver
+
+    def total(self):
+        return sum(self.commands.values())
+
+
+class StepHandler(logging.Handler):
+    """ turns the info log lines into step spans """
+
+    def __init__(self, tracer):
+        super().__init__(level=logging.INFO)
+        self.tracer = tracer
+        self.start = time.perf_counter()
+        self.commands = tracer.counter.total()
+
+    def emit(self, record):
+        now = time.perf_counter()
+        commands = self.tracer.counter.total()
+        self.tracer.add(
+            record.getMessage()[:80], self.start, now, cat="step", tid=2,
+            args={"webdriver_commands": commands - self.commands},
+        )
+        self.start = now
+        self.commands = commands
+
+
+class Tracer:
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.origin = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.counter = CommandCounter()
+        self.driver = None
+        self.events = []
+
+    def attach(self, driver):
+        """ counts the driver commands and enables its CDP performance metrics """
+        self.counter.attach(driver)
+        self.driver = driver
+        self.counter.paused = True
+        try:
+            driver.execute_cdp_cmd("Performance.enable", {})
+        except Exception as err:
+            logger.warning(f"CDP performance metrics not available: {str(err)}")
+        finally:
+            self.counter.paused = False
+        return driver
+
+    def detach(self):
+        """ to call before the driver quits """
+        self.driver = None
+
+    def _us(self, moment):
+        return int((moment - self.origin) * 1_000_000)
+
+    def add(self, name, start, end, cat="scraper", tid=1, args=None):
+        self.events.append({
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self._us(start),
+            "dur": self._us(end) - self._us(start),
+            "pid": 1,
+            "tid": tid,
+            "args": args or {},
+        })
+
+    def _metrics(self):
+        """ CDP metrics and navigation timing of the current page, the calls are not counted """
+        if self.driver is None:
+            return None, None
+        self.counter.paused = True
+        try:
+            metrics = self.driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+            navigation = self.driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+            return {metric["name"]: metric["value"] for metric in metrics}, navigation
+        except Exception:
+            # the driver quit or the tab closed within the span
+            return None, None
+        finally:
+            self.counter.paused = False
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        commands = self.counter.total()
+        before, _ = self._metrics()
+        args = dict(args)
+        try:
+            yield args
+        except Exception as err:
+            args["error"] = type(err).__name__
+            raise
+        finally:
+            end = time.perf_counter()
+            after, navigation = self._metrics()
+            args["webdriver_commands"] = self.counter.total() - commands
+            if after is not None:
+                args["metrics"] = {key: after[key] for key in ABSOLUTE_METRICS if key in after}
+                if before is not None:
+                    args["metrics"].update({
+                        key: round(after[key] - before[key], 4)
+                        for key in DELTA_METRICS if key in after and key in before
+                    })
+                self.events.append({
+                    "name": "JS heap (MB)",
+                    "ph": "C",
+                    "ts": self._us(end),
+                    "pid": 1,
+                    "args": {"used": round(after.get("JSHeapUsedSize", 0) / 1048576, 1)},
+                })
+            if navigation is not None:
+                args["navigation"] = navigation
+            self.add(name, start, end, args=args)
+
+    def to_json(self):
+        return {
+            "traceEvents": [
+                {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"scraper {self.run_id}"}},
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "phases"}},
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": {"name": "steps"}},
+            ] + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(),
+                "webdriver_commands": self.counter.commands,
+            },
+        }
+
+    def save(self, s3, bucket=BUCKET):
+        key = f"{RUNS_PREFIX}{self.run_id}/trace-{self.started_at.strftime('%Y%m%dT%H%M%S')}.json"
+        s3.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(self.to_json()),
+            ContentType="application/json",
+        )
+        logger.info(f"Trace saved to s3://{bucket}/{key}")
+        return key
@@ -0,0 +1,152 @@
+""" named readiness conditions used by the scraper instead of fixed sleeps
+
+    every wait polls every POLL_FREQUENCY seconds and returns as soon as its
+    condition holds; the time it actually took is recorded in Waits.timings
+"""
+
+import time
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import selenium.common.exceptions as Exceptions
+
+logger = logging.getLogger(__name__)
+
+WAIT_TIME = 10  # in seconds, default timeout of every wait
+POLL_FREQUENCY = 0.1  # in seconds
+SETTLE_TIME = 0.3  # in seconds, how long a list or the network must stay unchanged
+
+# MUI progress indicators shown by the WMS while it loads data
+SPINNER_SELECTOR = '[role="progressbar"], .MuiCircularProgress-root, .MuiLinearProgress-root'
+
+# counts the fetch / XHR requests in flight, installed before any page script runs
+NETWORK_HOOK_SCRIPT = """
+(() => {
+    if (window.__boltPending !== undefined) { return; }
+    window.__boltPending = 0;
+    const done = () => { window.__boltPending = Math.max(0, window.__boltPending - 1); };
+    const fetch = window.fetch;
+    window.fetch = function () {
+        window.__boltPending += 1;
+        return fetch.apply(this, arguments).finally(done);
+    };
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        window.__boltPending += 1;
+        this.addEventListener("loadend", done, { once: true });
+        return send.apply(this, arguments);
+    };
+})();
+"""
+
+PENDING_REQUESTS_SCRIPT = """
+if (document.readyState !== "complete") { return -1; }
+return window.__boltPending === undefined ? 0 : window.__boltPending;
+"""
+
+
+def install_network_hook(driver):
+    """ registers the in-flight requests counter for every page the driver opens """
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": NETWORK_HOOK_SCRIPT})
+
+
+class Waits:
+    def __init__(self, driver, timeout=WAIT_TIME, poll_frequency=POLL_FREQUENCY):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_frequency = poll_frequency
+        self.timings = []
+
+    def until(self, name, condition, timeout=None):
+        """ waits for condition(driver) to return a truthy value and records how long it took
+
+            raises selenium TimeoutException when the condition does not hold in time
+        """
+        start = time.perf_counter()
+        is_met = False
+        try:
+            result = WebDriverWait(
+                self.driver,
+                timeout or self.timeout,
+                poll_frequency=self.poll_frequency,
+                ignored_exceptions=[Exceptions.StaleElementReferenceException],
+            ).until(condition)
+            is_met = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings.append({"name": name, "seconds": round(elapsed, 3), "ok": is_met})
+            logger.debug(f"wait {name}: {elapsed:.3f} s")
+
+    def element_present(self, locator, name=None, timeout=None):
+        return self.until(name or f"present {locator[1]}", EC.presence_of_element_located(locator), timeout)
+
+    def element_clickable(self, locator, name=None, timeout=None):
+        return self.until(name or f"clickable {locator[1]}", EC.element_to_be_clickable(locator), timeout)
+
+    def text_present(self, text, name=None, timeout=None):
+        locator = (By.XPATH, f'//*[text()="{text}"]')
+        return self.until(name or f"text {text}", EC.presence_of_element_located(locator), timeout)
+
+    def spinner_gone(self, name="spinner gone", timeout=None):
+        return self.until(
+            name,
+            EC.invisibility_of_element_located((By.CSS_SELECTOR, SPINNER_SELECTOR)),
+            timeout,
+        )
+
+    def network_idle(self, name="network idle", timeout=None, settle=SETTLE_TIME):
+        """ document loaded and no fetch / XHR in flight for settle seconds """
+        idle_since = [None]
+
+        def condition(driver):
+            if driver.execute_script(PENDING_REQUESTS_SCRIPT) != 0:
+                idle_since[0] = None
+                return False
+            if idle_since[0] is None:
+                idle_since[0] = time.monotonic()
+            return time.monotonic() - idle_since[0] >= settle
+
+        return self.until(name, condition, timeout)
+
+    def list_stable(self, locator, name=None, timeout=None, settle=SETTLE_TIME, min_length=1):
+        """ at least min_length elements and their number unchanged for settle seconds
+
+            returns the elements
+        """
+        state = {"length": None, "since": None}
+
+        def condition(driver):
+            elements = driver.find_elements(*locator)
+            if len(elements) < min_length or len(elements) != state["length"]:
+                state["length"] = len(elements)
+                state["since"] = time.monotonic()
+                return False
+            if time.monotonic() - state["since"] < settle:
+                return False
+            return elements
+
+        return self.until(name or f"stable {locator[1]}", condition, timeout)
+
+    def page_ready(self, name="page ready", timeout=None):
+        """ the network went quiet and no loading indicator is left on screen """
+        self.network_idle(name=f"{name}: network", timeout=timeout)
+        self.spinner_gone(name=f"{name}: spinner", timeout=timeout)
+
+    def optional(self, wait, *args, **kwargs):
+        """ runs a wait the caller only needs for readiness: a timeout is logged and the caller goes on
+
+            returns the result of the wait, None when it timed out
+        """
+        try:
+            return wait(*args, **kwargs)
+        except Exceptions.TimeoutException:
+            name = kwargs.get("name", wait.__name__)
+            logger.warning(f"{name} not reached in {kwargs.get('timeout') or self.timeout} s, going on")
+            return None
+
+    def summary(self):
+        total = sum(timing["seconds"] for timing in self.timings)
+        return {"total_seconds": round(total, 3), "waits": self.timings}
@@ -0,0 +1,419 @@
+""" direct HTTP client for the WMS endpoints behind the Delivery Orders page
+
+    produces the same /tmp/Bulk PO.zip and /tmp/mov_data.csv as the browser,
+    with a pooled requests session instead of a headless Chrome
+
+    the WMS API is not documented and nothing in this module assumes its shape:
+    the requests and the reading of the answers are all configured in the
+    "WMS_API" key of the BoltPo-Robot secret. write it from a recording of the
+    Delivery Orders page (python replay.py record), fixtures/index.json lists
+    the requests the page makes and fixtures/bodies holds their answers. without
+    WMS_API the scraper only uses the browser
+
+    {
+        "login": {                          --- optional, without it the session cookies
+                                                 of a short browser login are borrowed ---
+            "path": "/...", "method": "POST",
+            "json": {"<user field>": "{user}", "<password field>": "{password}"},
+            "token": "<field holding a bearer token>"       --- optional ---
+        },
+        "stores": {"path": "/...", "items": "<list of stores>", "id": "<store id>", "name": "<store name>"},
+        "orders": {
+            "path": "/...",
+            "params": {"<store filter>": "{store_id}", "<page>": "{page}", ...},
+            "items": "<list of orders>",
+            "next_page": "<next page number, null on the last page>",   --- optional ---
+            "row": {"supplier": "...", "store": "...", "mov": "...", "has_order": "..."}
+        },
+        "export": {
+            "path": "/...", "method": "POST",
+            "json": {..., "<fields>": "{fields}", "<cities>": "{cities}"},
+            "url": "<field holding the file url>"           --- optional, the answer is
+                                                                 the zip file without it ---
+        }
+    }
+
+    "params" and "json" are sent as written, a string "{name}" stands for the value
+    of name. the field names are dotted paths in the json answer, "" being the whole
+    answer and a number an index in a list. every mov row is the supplier, the store,
+    whether has_order is truthy and the mov, as the browser reads them from the
+    table cells: the mapped fields must hold the same text as the cells for the
+    two engines to produce the same file
+
+    run the module directly to exercise the client against a local stand-in:
+
+        python wms_http.py
+"""
+
+import csv
+import html
+import logging
+import os
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from logging import INFO
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+CONNECT_TIMEOUT = 5  # in seconds
+READ_TIMEOUT = 60  # in seconds, the export is generated on request
+MAX_RETRIES = 2
+POOL_SIZE = 8
+CHUNK_SIZE = 1024 * 1024  # in bytes
+
+CITIES = ["Cluj-Napoca", "Bucharest"]
+
+# the Bulk PO columns ticked in the report modal
+REPORT_FIELDS = [
+    "po_number",
+    "product_name",
+    "provicer_id",
+    "plan_qty",
+    "supplier_name",
+    "unit",
+    "bolt_sku",
+    "delivery_date",
+    "supplier_sku",
+    "store_name",
+    "ean",
+]
+
+
+# the settings every endpoint needs, besides its path
+REQUIRED = {
+    "stores": ["items", "id", "name"],
+    "orders": ["items", "row"],
+    "export": [],
+}
+ROW_FIELDS = ["supplier", "store", "mov", "has_order"]
+DEFAULT_METHODS = {"login": "POST", "stores": "GET", "orders": "GET", "export": "POST"}
+
+
+class WmsHttpException(Exception): pass
+
+
+def check_config(config):
+    """ the problems of a WMS_API configuration, an empty list when it is usable """
+    if not isinstance(config, dict):
+        return ["WMS_API is not a mapping"]
+    problems = []
+    for name in ["login"] + list(REQUIRED):
+        if name not in config:
+            if name != "login":
+                problems.append(f"{name} endpoint missing")
+            continue
+        endpoint = config[name]
+        if not isinstance(endpoint, dict) or "path" not in endpoint:
+            problems.append(f"{name} endpoint has no path")
+            continue
+        problems += [f"{name} endpoint has no {key}" for key in REQUIRED.get(name, []) if key not in endpoint]
+    orders = config.get("orders")
+    if isinstance(orders, dict) and "row" in orders:
+        if not isinstance(orders["row"], dict):
+            problems.append("orders row is not a mapping")
+        else:
+            problems += [f"orders row has no {key}" for key in ROW_FIELDS if key not in orders["row"]]
+    return problems
+
+
+def fill(template, values):
+    """ the template with every "{name}" string replaced by values[name] """
+    if isinstance(template, dict):
+        return {key: fill(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill(value, values) for value in template]
+    if isinstance(template, str) and template[:1] == "{" and template[-1:] == "}" and template[1:-1] in values:
+        return values[template[1:-1]]
+    return template
+
+
+def pick(body, path):
+    """ the value at the dotted path of a json answer, raises KeyError, IndexError or TypeError """
+    value = body
+    for key in filter(None, path.split(".")):
+        value = value[int(key)] if isinstance(value, list) else value[key]
+    return value
+
+
+def cell_text(value):
+    """ a text answer field as the browser reads it from the cell innerHTML """
+    if value is None:
+        return None
+    return html.escape(str(value), quote=False)
+
+
+def get_session():
+    """ pooled session with bounded retries on connection errors and 5xx answers """
+    retries = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,
+        status=MAX_RETRIES,
+        status_forcelist=[502, 503, 504],
+        backoff_factor=0.5,
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class WmsClient:
+    def __init__(self, base_url, config, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        problems = check_config(config)
+        if len(problems) > 0:
+            raise WmsHttpException(f"WMS_API configuration not usable: {', '.join(problems)}")
+        self.base_url = base_url
+        self.config = config
+        self.timeout = timeout
+        self.session = get_session()
+
+    def _request(self, name, values=None, **kwargs):
+        """ sends the configured request of the endpoint, its templates filled with values """
+        endpoint = self.config[name]
+        values = values or {}
+        for key in ("params", "json"):
+            if key in endpoint:
+                kwargs[key] = fill(endpoint[key], values)
+        method = endpoint.get("method", DEFAULT_METHODS[name])
+        try:
+            response = self.session.request(
+                method, urljoin(self.base_url, endpoint["path"]), timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as err:
+            raise WmsHttpException(f"WMS {name} request error: {str(err)}")
+        if response.status_code in (401, 403):
+            raise WmsHttpException(f"WMS {name} request not authorized: {response.status_code}")
+        if response.status_code >= 400:
+            raise WmsHttpException(f"WMS {name} request failed: {response.status_code}")
+        return response
+
+    def _json(self, response, name):
+        try:
+            return response.json()
+        except ValueError:
+            # a login or error page instead of the data
+            raise WmsHttpException(
+                f"WMS {name} answer is not json: {response.headers.get('Content-Type', 'no content type')}"
+            )
+
+    def _pick(self, body, name, key):
+        """ the configured key of the endpoint read from its answer """
+        try:
+            return pick(body, self.config[name][key])
+        except (KeyError, IndexError, TypeError, ValueError) as err:
+            raise WmsHttpException(f"WMS {name} answer has no {key} ({self.config[name][key]}): {str(err)}")
+
+    def login(self, user, password):
+        response = self._request("login", {"user": user, "password": password})
+        token = None
+        if "token" in self.config["login"]:
+            token = self._pick(self._json(response, "login"), "login", "token")
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        elif len(self.session.cookies) == 0:
+            raise WmsHttpException("WMS login returned neither a token nor a session cookie")
+
+    def use_cookies(self, cookies):
+        """ borrows the session of a browser login, cookies as returned by driver.get_cookies() """
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/")
+            )
+
+    def list_stores(self):
+        """ [{"id", "name"}, ...] in the order of the store dropdown """
+        stores = self._pick(self._json(self._request("stores"), "stores"), "stores", "items")
+        if not isinstance(stores, list):
+            raise WmsHttpException("WMS stores answer has no list of stores")
+        return [
+            {"id": self._pick(store, "stores", "id"), "name": self._pick(store, "stores", "name")}
+            for store in stores
+        ]
+
+    def list_orders(self, store_id):
+        """ all the orders of the store, every page of them """
+        items = []
+        page = 1
+        while page is not None:
+            body = self._json(self._request("orders", {"store_id": store_id, "page": page}), "orders")
+            page_items = self._pick(body, "orders", "items")
+            if not isinstance(page_items, list):
+                raise WmsHttpException("WMS orders answer has no list of orders")
+            items += page_items
+            page = self._pick(body, "orders", "next_page") if "next_page" in self.config["orders"] else None
+        return items
+
+    def order_row(self, item):
+        """ the [supplier, store, has_order, mov] row of an order, as in the browser's mov_data """
+        fields = self.config["orders"]["row"]
+        try:
+            values = {key: pick(item, fields[key]) for key in ROW_FIELDS}
+        except (KeyError, IndexError, TypeError, ValueError) as err:
+            raise WmsHttpException(f"WMS order has no row field: {type(err).__name__} {str(err)}")
+        return [
+            cell_text(values["supplier"]),
+            cell_text(values["store"]),
+            bool(values["has_order"]),
+            "" if values["mov"] is None else cell_text(values["mov"]),
+        ]
+
+    def mov_rows(self, pool_size=POOL_SIZE):
+        """ the [supplier, store, has_order, mov] rows of every store, in store order """
+        stores = self.list_stores()
+        if len(stores) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(pool_size, len(stores))) as pool:
+            per_store = list(pool.map(lambda store: self.list_orders(store["id"]), stores))
+
+        rows = []
+        for store, items in zip(stores, per_store):
+            rows += [self.order_row(item) for item in items]
+            logger.info(f"Store {store['name']} has {len(items)} elements")
+        return rows
+
+    def export_bulk_po(self, path, fields=REPORT_FIELDS, cities=CITIES):
+        """ requests the Bulk PO xlsx export of all stores and suppliers and saves the zip to path """
+        response = self._request("export", {"fields": fields, "cities": cities}, stream=True)
+        if "url" in self.config["export"]:
+            url = self._pick(self._json(response, "export"), "export", "url")
+            if not url:
+                raise WmsHttpException("WMS export answered without a file url")
+            try:
+                response = self.session.get(urljoin(self.base_url, url), timeout=self.timeout, stream=True)
+                response.raise_for_status()
+            except requests.RequestException as err:
+                raise WmsHttpException(f"WMS export download error: {str(err)}")
+
+        size = 0
+        with open(path, "wb") as file:
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+                    size += len(chunk)
+            except requests.RequestException as err:
+                raise WmsHttpException(f"WMS export download error: {str(err)}")
+        if size == 0:
+            raise WmsHttpException("WMS export returned an empty file")
+        return size
+
+
+def run(client, download_dir, user=None, password=None, cookies=None, jobs=("mov", "export")):
+    """ writes mov_data.csv ("mov" job) and Bulk PO.zip ("export" job) to download_dir
+
+        logs in with user / password, or with the cookies of a browser session
+    """
+    if cookies is not None:
+        client.use_cookies(cookies)
+    else:
+        client.login(user, password)
+
+    if "mov" in jobs:
+        mov_data = client.mov_rows()
+        with open(os.path.join(download_dir, "mov_data.csv"), "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            for line in mov_data:
+                writer.writerow(line)
+        logger.info(f"MOV file saved, {len(mov_data)} rows")
+
+    if "export" in jobs:
+        size = client.export_bulk_po(os.path.join(download_dir, "Bulk PO.zip"))
+        logger.info(f"Bulk PO file downloaded, {size} bytes")
+
+
+if __name__ == "__main__":
+    # local stand-in of the WMS endpoints
+    import json
+    import tempfile
+    import threading
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    # the stand-in's own api, not the WMS one
+    CONFIG = {
+        "login": {"path": "/api/auth/login", "json": {"username": "{user}", "password": "{password}"}},
+        "stores": {"path": "/api/stores", "items": "", "id": "id", "name": "name"},
+        "orders": {
+            "path": "/api/delivery-orders",
+            "params": {"store_id": "{store_id}", "page": "{page}"},
+            "items": "items",
+            "next_page": "next_page",
+            "row": {"supplier": "supplier_name", "store": "store_name", "mov": "mov", "has_order": "mov_reached"},
+        },
+        "export": {
+            "path": "/api/delivery-orders/export",
+            "json": {"report": "bulk_po", "fields": "{fields}", "cities": "{cities}"},
+        },
+    }
+
+    class StandIn(BaseHTTPRequestHandler):
+        def _json(self, body, status=200, headers=()):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _authorized(self):
+            if "session=ok" not in self.headers.get("Cookie", ""):
+                self._json({"error": "login"}, status=401)
+                return False
+            return True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            url = urlparse(self.path)
+            if url.path == CONFIG["login"]["path"]:
+                if body["password"] != "secret":
+                    return self._json({"error": "credentials"}, status=401)
+                return self._json({}, headers=[("Set-Cookie", "session=ok; Path=/")])
+            if url.path == CONFIG["export"]["path"] and self._authorized():
+                data = b"PK\x05\x06" + bytes(18)  # empty zip archive
+                self.send_response(200)
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not self._authorized():
+                return
+            if url.path == CONFIG["stores"]["path"]:
+                return self._json([{"id": 1, "name": "Cluj 1"}, {"id": 2, "name": "Bucharest 1"}])
+            if url.path == CONFIG["orders"]["path"]:
+                query = parse_qs(url.query)
+                page = int(query["page"][0])
+                store = f"store {query['store_id'][0]}"
+                items = [
+                    {"supplier_name": f"supplier {page} & co", "store_name": store, "mov": "100", "mov_reached": True},
+                    {"supplier_name": f"supplier {page}b", "store_name": store, "mov": "250", "mov_reached": False},
+                ]
+                return self._json({"items": items, "next_page": 2 if page == 1 else None})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = WmsClient(f"http://127.0.0.1:{server.server_port}", CONFIG)
+    with tempfile.TemporaryDirectory() as folder:
+        run(client, folder, user="robot", password="secret")
+        with open(os.path.join(folder, "mov_data.csv"), "r") as csv_file:
+            print(csv_file.read())
+    server.shutdown()
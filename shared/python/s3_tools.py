@@ -0,0 +1,101 @@
+""" helpers used by the cleaners to move objects around the bucket without
+    pulling their content through the lambda, shipped in the shared layer
+"""
+
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from logging import INFO
+from boto3.s3.transfer import TransferConfig
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+# S3 refuses a single CopyObject above 5 GB, bigger objects are copied in parts
+MAX_SINGLE_COPY = 5 * 1024 ** 3
+COPY_PART_SIZE = 512 * 1024 ** 2
+
+MAX_DELETE_BATCH = 1000  # max number of keys accepted by delete_objects
+MAX_WORKERS = 8
+
+COPY_CONFIG = TransferConfig(
+    multipart_threshold=MAX_SINGLE_COPY,
+    multipart_chunksize=COPY_PART_SIZE,
+    max_concurrency=4,
+)
+
+
+def copy_object(s3, bucket, src_key, dst_key):
+    """ server-side copy, switches to multipart copy above the single copy limit """
+    s3.copy(
+        {"Bucket": bucket, "Key": src_key},
+        bucket,
+        dst_key,
+        Config=COPY_CONFIG,
+    )
+
+
+def copy_objects(s3, bucket, pairs):
+    """ copies the (source, destination) pairs concurrently
+
+        returns the list of source keys that could not be copied
+    """
+    failed = []
+    if len(pairs) == 0:
+        return failed
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(pairs))) as pool:
+        futures = {
+            pool.submit(copy_object, s3, bucket, src_key, dst_key): src_key
+            for src_key, dst_key in pairs
+        }
+        for future, src_key in futures.items():
+            try:
+                future.result()
+            except Exception as err:
+                logger.error(f"Copy of {src_key} failed: {str(err)}")
+                failed.append(src_key)
+
+    return failed
+
+
+def _delete_batch(s3, bucket, batch):
+    response = s3.delete_objects(
+        Bucket=bucket,
+        Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+    )
+    return response.get("Errors", [])
+
+
+def _batch_errors(future, keys):
+    try:
+        return future.result()
+    except Exception as err:
+        # the whole request failed, report every key of the batch
+        return [{"Key": key, "Code": "BatchFailed", "Message": str(err)} for key in keys]
+
+
+def delete_keys(s3, bucket, keys):
+    """ deletes the keys in concurrent batches of MAX_DELETE_BATCH
+
+        returns the per-key errors reported by S3
+    """
+    errors = []
+    if len(keys) == 0:
+        return errors
+
+    batches = [keys[i:i + MAX_DELETE_BATCH] for i in range(0, len(keys), MAX_DELETE_BATCH)]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as pool:
+        futures = [(pool.submit(_delete_batch, s3, bucket, batch), batch) for batch in batches]
+        for future, batch in futures:
+            errors.extend(_batch_errors(future, batch))
+
+    return errors
+
+
+def list_objects(s3, bucket, prefix):
+    """ yields every object under prefix, following the listing pagination """
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj
@@ -0,0 +1,164 @@
+""" cached access to AWS Secrets Manager, shared by the Bolt-PO lambdas
+
+    the zip lambdas get it from the shared layer (serverless_one.yml), the
+    docker images copy it next to their code, see their Dockerfile
+
+    secrets are parsed from json and kept in memory for SECRETS_TTL seconds,
+    so warm invocations do not call Secrets Manager again:
+
+        secrets = get_provider("eu-central-1", prefetch=["BoltPo-Robot"])
+        wms_user = secrets.get("BoltPo-Robot")["WMS_USER"]
+
+    for local runs and tests the secrets can be served without AWS:
+        BOLT_SECRETS_FILE   path to a json file {"secret-id": {...}, ...}
+        BOLT_SECRET_<ID>    the secret json for one id, the id is upper cased
+                            and non alphanumeric characters are replaced by _
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import boto3
+
+from logging import INFO
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=INFO)
+
+SECRETS_TTL = int(os.environ.get("BOLT_SECRETS_TTL", 900))  # in seconds
+MAX_BATCH_IDS = 20  # max number of ids accepted by batch_get_secret_value
+
+
+class SecretsProviderException(Exception): pass
+
+
+def _env_name(secret_id):
+    return "BOLT_SECRET_" + re.sub(r"[^A-Za-z0-9]", "_", secret_id).upper()
+
+
+def _local_secrets(secret_ids):
+    """ returns the secrets available from the local stand-ins """
+    found = {}
+    file_path = os.environ.get("BOLT_SECRETS_FILE")
+    if file_path:
+        with open(file_path, "r", encoding="utf-8") as file:
+            stored = json.load(file)
+        found.update({secret_id: stored[secret_id] for secret_id in secret_ids if secret_id in stored})
+
+    for secret_id in secret_ids:
+        value = os.environ.get(_env_name(secret_id))
+        if value is not None:
+            found[secret_id] = json.loads(value)
+
+    if file_path and len(found) < len(secret_ids):
+        # a local secrets file means no AWS access, missing ids are an error
+        missing = [secret_id for secret_id in secret_ids if secret_id not in found]
+        raise SecretsProviderException(f"Secrets not found in {file_path}: {missing}")
+
+    return found
+
+
+class SecretsProvider:
+    def __init__(self, region_name, ttl=SECRETS_TTL, prefetch=None):
+        self.region_name = region_name
+        self.ttl = ttl
+        self._client = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        if prefetch:
+            self.get_many(prefetch)
+
+    @property
+    def client(self):
+        if self._client is None:
+            session = boto3.session.Session()
+            self._client = session.client(service_name="secretsmanager", region_name=self.region_name)
+        return self._client
+
+    def get(self, secret_id):
+        """ returns the parsed secret, from cache while it is fresh """
+        return self.get_many([secret_id])[secret_id]
+
+    def get_many(self, secret_ids):
+        """ returns a dict secret_id -> parsed secret, fetching the expired ones in one batch """
+        now = time.monotonic()
+        secrets = {}
+        with self._lock:
+            for secret_id in secret_ids:
+                cached = self._cache.get(secret_id)
+                if cached is not None and cached[0] > now:
+                    secrets[secret_id] = cached[1]
+
+        missing = [secret_id for secret_id in secret_ids if secret_id not in secrets]
+        if len(missing) > 0:
+            fetched = self._fetch(missing)
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                for secret_id, value in fetched.items():
+                    self._cache[secret_id] = (expires, value)
+            secrets.update(fetched)
+
+        return secrets
+
+    def invalidate(self, secret_id=None):
+        """ drops one secret, or the whole cache, e.g. after a credentials rotation """
+        with self._lock:
+            if secret_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(secret_id, None)
+
+    def _fetch(self, secret_ids):
+        secrets = _local_secrets(secret_ids)
+        remaining = [secret_id for secret_id in secret_ids if secret_id not in secrets]
+        if len(remaining) == 0:
+            return secrets
+
+        if len(remaining) > 1 and hasattr(self.client, "batch_get_secret_value"):
+            for i in range(0, len(remaining), MAX_BATCH_IDS):
+                secrets.update(self._fetch_batch(remaining[i:i + MAX_BATCH_IDS]))
+        else:
+            # older botocore releases do not know the batch call
+            for secret_id in remaining:
+                response = self.client.get_secret_value(SecretId=secret_id)
+                secrets[secret_id] = json.loads(response["SecretString"])
+
+        logger.info(f"Fetched {len(remaining)} secrets from Secrets Manager")
+        return secrets
+
+    def _fetch_batch(self, secret_ids):
+        secrets = {}
+        kwargs = {"SecretIdList": secret_ids}
+        while True:
+            response = self.client.batch_get_secret_value(**kwargs)
+            if len(response.get("Errors", [])) > 0:
+                raise SecretsProviderException(response["Errors"])
+            for item in response["SecretValues"]:
+                # the batch answers with the secret name, map it back to the requested id
+                secret_id = item["Name"] if item["Name"] in secret_ids else item["ARN"]
+                secrets[secret_id] = json.loads(item["SecretString"])
+            if "NextToken" not in response:
+                break
+            kwargs["NextToken"] = response["NextToken"]
+        return secrets
+
+
+_providers = {}
+
+
+def get_provider(region_name, prefetch=None):
+    """ returns the process wide provider of a region, created on first use """
+    if region_name not in _providers:
+        _providers[region_name] = SecretsProvider(region_name)
+    provider = _providers[region_name]
+    if prefetch:
+        provider.get_many(prefetch)
+    return provider
+
+
+def get_secret(secret_id, region_name):
+    return get_provider(region_name).get(secret_id)
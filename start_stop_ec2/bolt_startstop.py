@@ -13,86 +13,75 @@
         "action": "Start"
     }
 
+    {
+        "groups": [
+            {"region": "eu-central-1", "names": "jumpbox,scrap-machine-dev", "action": "Start"}
+        ]
+    }
+
 """
 
-import json
-import boto3
-from time import sleep
+from secrets_provider import get_provider
+from ec2_tools import get_client, get_instance_ids, handle_groups, wait_until_running
 
-# get AWS Secrets Manager
+# get AWS Secrets Manager, cached across warm invocations
 secret_name = "AWS_LambdaKeys"
 region_name = "eu-north-1"
-session = boto3.session.Session()
-client = session.client(service_name="secretsmanager", region_name=region_name)
-# call secrets
-get_secrets = client.get_secret_value(SecretId=secret_name)
-secrets = get_secrets["SecretString"]
-secrets_json = json.loads(secrets)
+secrets_json = get_provider(region_name, prefetch=[secret_name]).get(secret_name)
 
 AWS_ACCESS_KEY_ID = secrets_json["Access_key_ID"]
 AWS_SECRET_ACCESS_KEY = secrets_json["Secret_Access_key"]
 
-WAIT_TIME = 10
-
-region = "eu-central-1"
-ec2 = boto3.client(
-    "ec2",
-    region_name=region,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-)
-
+WAIT_TIME = 10  # max seconds between two readiness polls
 
-def get_instance_ids(instance_names):
-    all_instances = ec2.describe_instances()
-
-    instance_ids = []
-
-    # get instance-id based on instance name
-    for instance_name in instance_names:
-        for reservation in all_instances["Reservations"]:
-            for instance in reservation["Instances"]:
-                if "Tags" in instance:
-                    for tag in instance["Tags"]:
-                        if tag["Key"] == "Name" and tag["Value"] == instance_name:
-                            instance_ids.append(instance["InstanceId"])
-
-    return instance_ids
+region = "eu-central-1"  # default region of the single group events
+ec2 = get_client(region, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
 
 
 def handler(event, context):
     """instance_names = event["instances"].split(",")
     action = event["action"]"""
 
-    instance_names = event[list(event)[-1]]["EC2_fc_instance"].split(",")
-    action = event[list(event)[-1]]["EC2_fc_action"]
-
-    instance_ids = get_instance_ids(instance_names)
-
+    if "groups" in event:
+        return handle_groups(
+            event["groups"],
+            (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY),
+            context,
+            max_delay=WAIT_TIME,
+        )
+
+    # the single group event comes wrapped by the orchestrator, its payload is the last key
+    payload = event[list(event)[-1]]
+
+    instance_names = payload["EC2_fc_instance"].split(",")
+    action = payload["EC2_fc_action"]
+
+    instance_ids, unresolved = get_instance_ids(ec2, instance_names)
+    if len(instance_ids) == 0:
+        return {
+            "function_name": "Bolt-PO-StartStopEC2",
+            "success": False,
+            "unresolved_instances": unresolved,
+        }
+
+    states = None
     if action == "Start":
         ec2.start_instances(InstanceIds=instance_ids)
-        # check if machines are running
-        for instance in instance_ids:
-            for i in range(10):
-                sleep(12)
-                response = ec2.describe_instance_status(
-                    InstanceIds=[
-                        instance,
-                    ],
-                )
-                try:
-                    if response["InstanceStatuses"][0]["InstanceState"]["Code"] == 16:
-                        break
-                except:
-                    if i == 9:
-                        return {
-                            "function_name": "Bolt-PO-StartStopEC2",
-                            "success": False,
-                        }
+        # check if machines are running, all of them polled together
+        is_running, states = wait_until_running(ec2, instance_ids, context, max_delay=WAIT_TIME)
+        if not is_running:
+            return {
+                "function_name": "Bolt-PO-StartStopEC2",
+                "success": False,
+                "unresolved_instances": unresolved,
+                "instances": states,
+            }
     elif action == "Stop":
         ec2.stop_instances(InstanceIds=instance_ids)
 
     return {
         "function_name": "Bolt-PO-StartStopEC2",
         "success": True,
+        "unresolved_instances": unresolved,
+        "instances": states,
     }
@@ -6,85 +6,126 @@
     {
         "EC2_fc_instance": "jumpbox,scrap-machine-dev",
         "EC2_fc_action": "Start", --- or "Stop" ---
+        "EC2_fc_wait": true --- optional, false returns right after the start request ---
     }
 
-"""
+    or a list of groups, run concurrently, one per region and action:
 
-import json
-import boto3
-from time import sleep
+    {
+        "groups": [
+            {"region": "eu-central-1", "names": ["jumpbox", "scrap-machine-dev"], "action": "Start"},
+            {"region": "eu-west-1", "names": ["scrap-machine-ie"], "action": "Stop"}
+        ],
+        "wait": true
+    }
 
-# get AWS Secrets Manager
-secret_name = "AWS_LambdaKeys"
-region_name = "eu-north-1"
-session = boto3.session.Session()
-client = session.client(service_name="secretsmanager", region_name=region_name)
-# call secrets
-get_secrets = client.get_secret_value(SecretId=secret_name)
-secrets = get_secrets["SecretString"]
-secrets_json = json.loads(secrets)
+    with "EC2_fc_wait": false (or "wait": false for groups) the reply carries a
+    token, the orchestrator waits outside lambda and asks check_ready for the
+    instances state:
 
-AWS_ACCESS_KEY_ID = secrets_json["Access_key_ID"]
-AWS_SECRET_ACCESS_KEY = secrets_json["Secret_Access_key"]
+    {
+        "token": "eyJyZWdpb24iOi..."
+    }
 
-WAIT_TIME = 10
+"""
 
-region = "eu-central-1"
-ec2 = boto3.client(
-    "ec2",
-    region_name=region,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+from secrets_provider import get_provider
+from ec2_tools import (
+    get_client,
+    get_instance_ids,
+    get_instance_states,
+    handle_groups,
+    make_token,
+    read_token,
+    wait_until_running,
 )
 
+# get AWS Secrets Manager, cached across warm invocations
+secret_name = "AWS_LambdaKeys"
+region_name = "eu-north-1"
+secrets_json = get_provider(region_name, prefetch=[secret_name]).get(secret_name)
 
-def get_instance_ids(instance_names):
-    all_instances = ec2.describe_instances()
-
-    instance_ids = []
+AWS_ACCESS_KEY_ID = secrets_json["Access_key_ID"]
+AWS_SECRET_ACCESS_KEY = secrets_json["Secret_Access_key"]
 
-    # get instance-id based on instance name
-    for instance_name in instance_names:
-        for reservation in all_instances["Reservations"]:
-            for instance in reservation["Instances"]:
-                if "Tags" in instance:
-                    for tag in instance["Tags"]:
-                        if tag["Key"] == "Name" and tag["Value"] == instance_name:
-                            instance_ids.append(instance["InstanceId"])
+WAIT_TIME = 10  # max seconds between two readiness polls
 
-    return instance_ids
+region = "eu-central-1"  # default region of the single group events
+ec2 = get_client(region, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY)
 
 
 def handler(event, context):
+    if "groups" in event:
+        return handle_groups(
+            event["groups"],
+            (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY),
+            context,
+            wait=event.get("wait", True),
+            max_delay=WAIT_TIME,
+        )
+
     instance_names = event["EC2_fc_instance"].split(",")
     action = event["EC2_fc_action"]
+    wait = event.get("EC2_fc_wait", True)
 
-    instance_ids = get_instance_ids(instance_names)
+    instance_ids, unresolved = get_instance_ids(ec2, instance_names)
+    if len(instance_ids) == 0:
+        return {
+            "function_name": "Bolt-PO-StartStopEC2",
+            "success": False,
+            "unresolved_instances": unresolved,
+        }
 
+    states = None
     if action == "Start":
         ec2.start_instances(InstanceIds=instance_ids)
-        # check if machines are running
-        for instance in instance_ids:
-            for i in range(10):
-                sleep(12)
-                response = ec2.describe_instance_status(
-                    InstanceIds=[
-                        instance,
-                    ],
-                )
-                try:
-                    if response["InstanceStatuses"][0]["InstanceState"]["Code"] == 16:
-                        break
-                except:
-                    if i == 9:
-                        return {
-                            "function_name": "Bolt-PO-StartStopEC2",
-                            "success": False,
-                        }
+        if not wait:
+            # non-blocking start, readiness is checked later through check_ready
+            return {
+                "function_name": "Bolt-PO-StartStopEC2",
+                "success": True,
+                "unresolved_instances": unresolved,
+                "instance_ids": instance_ids,
+                "token": make_token(region, instance_ids),
+            }
+        # check if machines are running, all of them polled together
+        is_running, states = wait_until_running(ec2, instance_ids, context, max_delay=WAIT_TIME)
+        if not is_running:
+            return {
+                "function_name": "Bolt-PO-StartStopEC2",
+                "success": False,
+                "unresolved_instances": unresolved,
+                "instances": states,
+            }
     elif action == "Stop":
         ec2.stop_instances(InstanceIds=instance_ids)
 
     return {
         "function_name": "Bolt-PO-StartStopEC2",
         "success": True,
+        "unresolved_instances": unresolved,
+        "instances": states,
+    }
+
+
+def check_ready(event, context):
+    """ answers in one call whether the instances of a non-blocking start are running """
+    try:
+        token = read_token(event["token"])
+    except Exception as err:
+        return {
+            "function_name": "Bolt-PO-StartStopEC2-CheckReady",
+            "ready": False,
+            "error_message": f"Invalid token: {str(err)}",
+        }
+
+    states = get_instance_states(
+        get_client(token["region"], AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY),
+        token["instance_ids"],
+    )
+    return {
+        "function_name": "Bolt-PO-StartStopEC2-CheckReady",
+        "ready": all(state == "running" for state in states.values()),
+        "instances": states,
+        "token": event["token"],
     }
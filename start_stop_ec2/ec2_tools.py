@@ -0,0 +1,263 @@
+""" helpers shared by the StartStopEC2 handlers
+
+    set EC2_LOCAL_MODE=moto to run the handlers against an in-memory moto
+    backend instead of AWS (moto is only needed for that, it is not part of
+    the lambda package). the lambda keys then come from the local secrets
+    stand-in, e.g. BOLT_SECRET_AWS_LAMBDAKEYS='{"Access_key_ID": "testing", ...}'
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import boto3
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import sleep
+from botocore.config import Config
+
+# name -> instance ids resolutions are reused by warm invocations for this long
+INSTANCE_CACHE_TTL = 60  # in seconds
+
+# terminated instances keep their Name tag for a while, they must not be resolved
+LIVE_STATES = ["pending", "running", "stopping", "stopped", "shutting-down"]
+
+# readiness polling
+FIRST_POLL_DELAY = 2  # in seconds
+POLL_BACKOFF = 1.5
+MAX_WAIT = 120  # in seconds, used when there is no lambda context
+DEADLINE_MARGIN = 3  # in seconds, kept to answer before the lambda times out
+FAILED_STATES = ["shutting-down", "terminated"]
+
+CLIENT_CONFIG = Config(max_pool_connections=10, retries={"mode": "standard"})
+
+_instance_cache = {}
+_clients = {}
+_clients_lock = threading.Lock()
+_local_backend = None
+
+
+def _start_local_backend():
+    global _local_backend
+    if _local_backend is None:
+        import moto
+
+        # moto 5 has a single mock for all services, older releases one per service
+        mock = moto.mock_aws() if hasattr(moto, "mock_aws") else moto.mock_ec2()
+        mock.start()
+        _local_backend = mock
+
+
+def get_client(region, aws_access_key_id=None, aws_secret_access_key=None):
+    """ returns the pooled ec2 client of a region, created on first use """
+    with _clients_lock:
+        if region not in _clients:
+            if os.environ.get("EC2_LOCAL_MODE") == "moto":
+                _start_local_backend()
+            _clients[region] = boto3.client(
+                "ec2",
+                region_name=region,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                config=CLIENT_CONFIG,
+            )
+        return _clients[region]
+
+
+def resolve_instances(ec2, instance_names, use_cache=True):
+    """ resolves instance names (the Name tag) to instance ids
+
+        uses a server-side filtered and paginated describe_instances call for
+        the names that are not cached yet
+
+        returns a dict name -> list of instance ids and the list of names
+        that did not resolve to any instance
+    """
+    region = ec2.meta.region_name
+    now = time.monotonic()
+
+    resolved = {}
+    for name in instance_names:
+        cached = _instance_cache.get((region, name)) if use_cache else None
+        if cached is not None and cached[0] > now:
+            resolved[name] = cached[1]
+
+    missing = [name for name in instance_names if name not in resolved]
+    if len(missing) > 0:
+        fetched = {}
+        paginator = ec2.get_paginator("describe_instances")
+        pages = paginator.paginate(
+            Filters=[
+                {"Name": "tag:Name", "Values": missing},
+                {"Name": "instance-state-name", "Values": LIVE_STATES},
+            ]
+        )
+        for page in pages:
+            for reservation in page["Reservations"]:
+                for instance in reservation["Instances"]:
+                    tags = {tag["Key"]: tag["Value"] for tag in instance.get("Tags", [])}
+                    fetched.setdefault(tags.get("Name"), []).append(instance["InstanceId"])
+
+        expires = time.monotonic() + INSTANCE_CACHE_TTL
+        for name in missing:
+            if name in fetched:
+                resolved[name] = fetched[name]
+                _instance_cache[(region, name)] = (expires, fetched[name])
+
+    unresolved = [name for name in instance_names if name not in resolved]
+    return resolved, unresolved
+
+
+def get_instance_ids(ec2, instance_names, use_cache=True):
+    """ returns the instance ids of the named instances and the unresolved names """
+    names = [name.strip() for name in instance_names if name.strip() != ""]
+    resolved, unresolved = resolve_instances(ec2, names, use_cache=use_cache)
+
+    instance_ids = []
+    for name in names:
+        for instance_id in resolved.get(name, []):
+            if instance_id not in instance_ids:
+                instance_ids.append(instance_id)
+
+    return instance_ids, unresolved
+
+
+def get_instance_states(ec2, instance_ids):
+    """ returns a dict instance id -> state name, read with one batched call """
+    states = {instance_id: "unknown" for instance_id in instance_ids}
+    paginator = ec2.get_paginator("describe_instance_status")
+    for page in paginator.paginate(InstanceIds=instance_ids, IncludeAllInstances=True):
+        for status in page["InstanceStatuses"]:
+            states[status["InstanceId"]] = status["InstanceState"]["Name"]
+    return states
+
+
+def wait_until_running(ec2, instance_ids, context=None, max_delay=10):
+    """ polls all the instances together until they are running
+
+        the poll interval starts at FIRST_POLL_DELAY and grows up to max_delay;
+        the overall deadline is the lambda remaining time (minus a margin) or
+        MAX_WAIT when called without a context
+
+        returns whether all instances are running and the per-instance states
+    """
+    max_wait = MAX_WAIT
+    if context is not None:
+        max_wait = context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN
+    deadline = time.monotonic() + max_wait
+
+    delay = FIRST_POLL_DELAY
+    while True:
+        states = get_instance_states(ec2, instance_ids)
+        if all(state == "running" for state in states.values()):
+            return True, states
+        if any(state in FAILED_STATES for state in states.values()):
+            return False, states
+        if time.monotonic() + delay > deadline:
+            return False, states
+
+        sleep(delay)
+        delay = min(delay * POLL_BACKOFF, max_delay)
+
+
+def make_token(region, instance_ids):
+    """ opaque token handed to the orchestrator, it carries what check_ready needs """
+    payload = {
+        "region": region,
+        "instance_ids": instance_ids,
+        "requested_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def read_token(token):
+    return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+
+
+def run_group(ec2, group, context=None, wait=True, max_delay=10):
+    """ applies the action of one {region, names, action} group
+
+        returns the group result with the state of every instance
+    """
+    names = group["names"]
+    if isinstance(names, str):
+        names = names.split(",")
+    names = [name.strip() for name in names if name.strip() != ""]
+    action = group["action"]
+
+    resolved, unresolved = resolve_instances(ec2, names)
+    instance_ids = []
+    owners = {}
+    for name in names:
+        for instance_id in resolved.get(name, []):
+            if instance_id not in owners:
+                instance_ids.append(instance_id)
+                owners[instance_id] = name
+
+    result = {
+        "region": group["region"],
+        "action": action,
+        "success": False,
+        "unresolved_instances": unresolved,
+        "instances": {},
+    }
+    if len(instance_ids) == 0:
+        return result
+
+    if action == "Start":
+        ec2.start_instances(InstanceIds=instance_ids)
+        if wait:
+            is_running, states = wait_until_running(ec2, instance_ids, context, max_delay=max_delay)
+        else:
+            is_running, states = True, get_instance_states(ec2, instance_ids)
+            result["token"] = make_token(group["region"], instance_ids)
+    elif action == "Stop":
+        response = ec2.stop_instances(InstanceIds=instance_ids)
+        is_running = True
+        states = {
+            item["InstanceId"]: item["CurrentState"]["Name"]
+            for item in response["StoppingInstances"]
+        }
+    else:
+        result["error_message"] = f"Unknown action: {action}"
+        return result
+
+    result["success"] = is_running
+    result["instances"] = {
+        instance_id: {"name": owners[instance_id], "state": states.get(instance_id, "unknown")}
+        for instance_id in instance_ids
+    }
+    return result
+
+
+def run_groups(groups, credentials, context=None, wait=True, max_delay=10):
+    """ runs the groups concurrently, each one on the pooled client of its region """
+    def run(group):
+        ec2 = get_client(group["region"], *credentials)
+        try:
+            return run_group(ec2, group, context, wait=wait, max_delay=max_delay)
+        except Exception as err:
+            return {
+                "region": group["region"],
+                "action": group.get("action"),
+                "success": False,
+                "error_message": str(err),
+                "instances": {},
+            }
+
+    if len(groups) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        return list(pool.map(run, groups))
+
+
+def handle_groups(groups, credentials, context=None, wait=True, max_delay=10):
+    """ runs the groups and answers the lambda, success only when every group succeeded """
+    results = run_groups(groups, credentials, context, wait=wait, max_delay=max_delay)
+    return {
+        "function_name": "Bolt-PO-StartStopEC2",
+        "success": all(result["success"] for result in results),
+        "groups": results,
+    }
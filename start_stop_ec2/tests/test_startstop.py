@@ -0,0 +1,63 @@
+""" start / stop handler events, run with: pytest start_stop_ec2/tests """
+
+import json
+import sys
+
+import boto3
+import pytest
+
+from moto import mock_aws
+
+REGION = "eu-central-1"
+SECRET = {"Access_key_ID": "testing", "Secret_Access_key": "testing"}
+
+
+@pytest.fixture
+def bolt_startstop(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+    monkeypatch.setenv("BOLT_SECRET_AWS_LAMBDAKEYS", json.dumps(SECRET))
+    with mock_aws():
+        import ec2_tools
+        # clients and resolutions must not outlive the mock they were made in
+        ec2_tools._clients.clear()
+        ec2_tools._instance_cache.clear()
+        sys.modules.pop("bolt_startstop", None)
+        import bolt_startstop
+        yield bolt_startstop
+        ec2_tools._clients.clear()
+        ec2_tools._instance_cache.clear()
+
+
+def run_instance(name):
+    ec2 = boto3.client("ec2", region_name=REGION)
+    response = ec2.run_instances(
+        ImageId="ami-12c6146b",
+        MinCount=1,
+        MaxCount=1,
+        TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": name}]}],
+    )
+    return response["Instances"][0]["InstanceId"]
+
+
+def test_wrapped_event(bolt_startstop):
+    instance_id = run_instance("jumpbox")
+
+    reply = bolt_startstop.handler({"Payload": {"EC2_fc_instance": "jumpbox", "EC2_fc_action": "Stop"}}, None)
+
+    assert reply["success"] is True
+    assert reply["unresolved_instances"] == []
+    ec2 = boto3.client("ec2", region_name=REGION)
+    instance = ec2.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"][0]
+    assert instance["State"]["Name"] in ("stopping", "stopped")
+
+
+def test_groups_event(bolt_startstop):
+    instance_id = run_instance("scrap-machine-dev")
+
+    reply = bolt_startstop.handler(
+        {"groups": [{"region": REGION, "names": "scrap-machine-dev,unknown", "action": "Stop"}]}, None
+    )
+
+    assert reply["success"] is True
+    assert reply["groups"][0]["unresolved_instances"] == ["unknown"]
+    assert reply["groups"][0]["instances"] == {instance_id: {"name": "scrap-machine-dev", "state": "stopping"}}
@@ -23,23 +23,15 @@ import boto3
 from datetime import datetime
 from logging import INFO
 from botocore.exceptions import ClientError
+from secrets_provider import get_provider
 
 class MailerException(Exception): pass
 
 logger = logging.getLogger(__name__)
 logger.setLevel(level=INFO)
 
-session = boto3.session.Session()
-sm_client = session.client(
-    service_name='secretsmanager',
-    region_name='eu-central-1'
-)
-
 try:
-    response = sm_client.get_secret_value(
-        SecretId='BoltPo-Robot'
-    )
-    secrets = json.loads(response['SecretString'])
+    secrets = get_provider("eu-central-1").get("BoltPo-Robot")
 except ClientError as e:
     logger.critical(f'Error getting secret: {str(e)}')
     reply = {